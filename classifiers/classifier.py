@@ -14,6 +14,12 @@
 #
 
 from abc import ABC, abstractmethod
+from collections import namedtuple
+
+import sklearn.metrics
+
+# Metrics of a classifier on test data, all from one prediction pass
+Evaluation = namedtuple('Evaluation', ['f1_micro', 'report', 'confusion_matrix', 'labels'])
 
 
 class Classifier(ABC):
@@ -23,9 +29,53 @@ class Classifier(ABC):
         pass
 
     @abstractmethod
-    def report(self, x_data, y_data):
+    def predict(self, x_data):
+        pass
+
+    @abstractmethod
+    def predict_proba(self, x_data):
+        # Probability of every class (columns in the order of classes) for every row
+        pass
+
+    @property
+    @abstractmethod
+    def classes(self):
+        pass
+
+    @abstractmethod
+    def to_arrays(self) -> dict:
+        # Fitted state as named numpy arrays, from_arrays restores the classifier from them
         pass
 
+    @classmethod
     @abstractmethod
+    def from_arrays(cls, arrays: dict):
+        pass
+
+    def evaluate(self, x_data, y_data) -> Evaluation:
+        y_prediction = self.predict(x_data)
+        labels = sorted(set(y_data) | set(y_prediction))
+        return Evaluation(sklearn.metrics.f1_score(y_data, y_prediction, average='micro'),
+                          sklearn.metrics.classification_report(y_data, y_prediction),
+                          sklearn.metrics.confusion_matrix(y_data, y_prediction, labels=labels),
+                          labels)
+
+    def report(self, x_data, y_data):
+        return self.evaluate(x_data, y_data).report
+
     def f1_micro(self, x_data, y_data):
+        return self.evaluate(x_data, y_data).f1_micro
+
+
+class StreamingClassifier(Classifier):
+    # Classifier that is trained from batches of the training data, so the whole (dense) feature matrix is never built.
+    # Every batch is observed once before training, then batches are passed over `epochs` times.
+    epochs = 1
+
+    def observe(self, x_batch):
+        # First pass over the training batches (e.g. feature scales), so all the batches are trained on the same terms
+        pass
+
+    @abstractmethod
+    def partial_fit(self, x_batch, y_batch, classes):
         pass
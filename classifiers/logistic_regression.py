@@ -15,23 +15,60 @@
 
 from classifiers.classifier import Classifier
 from sklearn.linear_model import LogisticRegression
-import sklearn.metrics
+from sklearn.preprocessing import MaxAbsScaler
+
+PENALTY_L1 = 'l1'
+PENALTY_L2 = 'l2'
+PENALTY_CHOICES = [PENALTY_L1, PENALTY_L2]
+
+SOLVER_LIBLINEAR = 'liblinear'
+SOLVER_SAGA = 'saga'
+SOLVER_CHOICES = [SOLVER_LIBLINEAR, SOLVER_SAGA]
 
 
 class LogisticRegressionClassifier(Classifier):
 
     model = None
+    scaler = None
 
-    def __init__(self):
-        self.model = LogisticRegression(solver='liblinear', multi_class='auto', max_iter=1000, n_jobs=1)
+    def __init__(self, c=1.0, penalty=PENALTY_L2, solver=SOLVER_LIBLINEAR, max_iter=1000, warm_start=False):
+        self.model = LogisticRegression(C=c, penalty=penalty, solver=solver, multi_class='auto', max_iter=max_iter, warm_start=warm_start,
+                                        n_jobs=1)
+        # Saga converges slowly on features with very different ranges (counts, percentages), so they are max-abs scaled for it
+        if solver == SOLVER_SAGA:
+            self.scaler = MaxAbsScaler()
 
     def train(self, x_data, y_data):
+        if self.scaler is not None:
+            x_data = self.scaler.fit(x_data).transform(x_data)
         self.model.fit(x_data, y_data)
 
-    def report(self, x_data, y_data):
-        y_prediction = self.model.predict(x_data)
-        return sklearn.metrics.classification_report(y_data, y_prediction)
+    def predict(self, x_data):
+        return self.model.predict(self._scaled(x_data))
+
+    def predict_proba(self, x_data):
+        return self.model.predict_proba(self._scaled(x_data))
+
+    def _scaled(self, x_data):
+        return x_data if self.scaler is None else self.scaler.transform(x_data)
+
+    @property
+    def classes(self):
+        return self.model.classes_
+
+    def to_arrays(self) -> dict:
+        arrays = {'classes': self.model.classes_.astype(str), 'coef': self.model.coef_, 'intercept': self.model.intercept_}
+        if self.scaler is not None:
+            arrays['scale'] = self.scaler.scale_
+        return arrays
 
-    def f1_micro(self, x_data, y_data):
-        y_prediction = self.model.predict(x_data)
-        return sklearn.metrics.f1_score(y_data, y_prediction, average='micro')
+    @classmethod
+    def from_arrays(cls, arrays: dict):
+        # Only saga models are scaled, and the solver decides how probabilities are computed (one vs rest or multinomial)
+        classifier = cls(solver=SOLVER_SAGA if 'scale' in arrays else SOLVER_LIBLINEAR)
+        classifier.model.classes_ = arrays['classes']
+        classifier.model.coef_ = arrays['coef']
+        classifier.model.intercept_ = arrays['intercept']
+        if 'scale' in arrays:
+            classifier.scaler.scale_ = arrays['scale']
+        return classifier
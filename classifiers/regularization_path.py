@@ -0,0 +1,43 @@
+#  Copyright (C) 2019 Oleg Shnaydman, Victoria Smolensky
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import time
+import warnings
+from collections import namedtuple
+
+from sklearn.exceptions import ConvergenceWarning
+
+from classifiers.logistic_regression import LogisticRegressionClassifier, SOLVER_SAGA
+
+# Test result of one (penalty, C) point of a regularization path
+PathPoint = namedtuple('PathPoint', ['penalty', 'c', 'f1_micro', 'fit_seconds', 'iterations'])
+
+
+def fit_path(x_train, y_train, x_test, y_test, penalty: str, c_values: list, max_iter=1000) -> list:
+    # Logistic regression (saga) fitted for increasing C values on the same feature matrices - the classifier that runs
+    # with -ls saga -lp <penalty> -lc <C>. Every fit starts from the weights of the previous (more regularized) one,
+    # which is already close to its solution.
+    classifier = LogisticRegressionClassifier(penalty=penalty, solver=SOLVER_SAGA, max_iter=max_iter, warm_start=True)
+    points = list()
+    for c in sorted(c_values):
+        classifier.model.set_params(C=c)
+        start = time.time()
+        with warnings.catch_warnings():
+            # Points that stop at max_iter are reported by their iterations
+            warnings.simplefilter('ignore', ConvergenceWarning)
+            classifier.train(x_train, y_train)
+        fit_seconds = time.time() - start
+        points.append(PathPoint(penalty, c, classifier.f1_micro(x_test, y_test), fit_seconds, int(classifier.model.n_iter_.max())))
+    return points
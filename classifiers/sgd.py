@@ -0,0 +1,76 @@
+#  Copyright (C) 2019 Oleg Shnaydman, Victoria Smolensky
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+
+import numpy as np
+from sklearn.linear_model import SGDClassifier
+from sklearn.preprocessing import MaxAbsScaler
+
+from classifiers.classifier import StreamingClassifier
+
+# Logistic loss was renamed in newer scikit-learn versions
+LOG_LOSS = 'log_loss' if 'log_loss' in SGDClassifier.loss_functions else 'log'
+
+
+class SgdLogisticClassifier(StreamingClassifier):
+
+    model = None
+    scaler = None
+
+    def __init__(self, epochs=5, alpha=1e-4, random_state=0):
+        self.epochs = epochs
+        self.model = SGDClassifier(loss=LOG_LOSS, alpha=alpha, random_state=random_state)
+        # Features have very different ranges (counts, percentages), SGD needs them on one scale.
+        # Max-abs scaling keeps sparse batches sparse and is fitted batch by batch before training.
+        self.scaler = MaxAbsScaler()
+        self.random = np.random.RandomState(random_state)
+
+    def observe(self, x_batch):
+        self.scaler.partial_fit(x_batch)
+
+    def partial_fit(self, x_batch, y_batch, classes):
+        self.model.partial_fit(self.scaler.transform(x_batch), y_batch, classes=classes)
+
+    def train(self, x_data, y_data):
+        # Shuffled passes over the whole training data
+        y_data = np.asarray(y_data)
+        classes = np.unique(y_data)
+        self.scaler.fit(x_data)
+        for _ in range(self.epochs):
+            order = self.random.permutation(len(y_data))
+            self.model.partial_fit(self.scaler.transform(x_data[order]), y_data[order], classes=classes)
+
+    def predict(self, x_data):
+        return self.model.predict(self.scaler.transform(x_data))
+
+    def predict_proba(self, x_data):
+        return self.model.predict_proba(self.scaler.transform(x_data))
+
+    @property
+    def classes(self):
+        return self.model.classes_
+
+    def to_arrays(self) -> dict:
+        return {'classes': self.model.classes_.astype(str), 'coef': self.model.coef_, 'intercept': self.model.intercept_,
+                'scale': self.scaler.scale_}
+
+    @classmethod
+    def from_arrays(cls, arrays: dict):
+        classifier = cls()
+        classifier.model.classes_ = arrays['classes']
+        classifier.model.coef_ = arrays['coef']
+        classifier.model.intercept_ = arrays['intercept']
+        classifier.scaler.scale_ = arrays['scale']
+        return classifier
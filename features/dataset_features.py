@@ -0,0 +1,53 @@
+#  Copyright (C) 2019 Oleg Shnaydman, Victoria Smolensky
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+
+import scipy.sparse
+
+from features.feature_executor import FeatureExecutor
+from features.features_vector import FeatureVector
+from features.ngram_encoder import NgramIndex
+from parsers.message_document import MessageDocument
+
+
+class DatasetFeatures:
+    # Blocks of the features that don't depend on the training messages, computed once for all the messages
+    # of the dataset. Runs (users number, iteration) only slice their rows by the row ids of the messages.
+
+    def __init__(self, messages: list, executor: FeatureExecutor = None, verbose=False):
+        self.documents = [MessageDocument(message, row_id) for row_id, message in enumerate(messages)]
+        self.executor = executor
+        self.verbose = verbose
+        self.blocks = dict()
+        self.ngram_indices = dict()
+
+    def ngram_index(self, n):
+        # Vocabulary features of every run are derived from one n-gram index of the dataset
+        if n not in self.ngram_indices:
+            self.ngram_indices[n] = NgramIndex(n, [document.message for document in self.documents])
+        return self.ngram_indices[n]
+
+    def documents_of(self, row_ids):
+        return [self.documents[row_id] for row_id in row_ids]
+
+    def blocks_of(self, features, row_ids):
+        # Blocks of the not fitted features for the given rows, fitted features are left for the run
+        dataset_features = [feature for feature in features if not feature.fitted]
+        FeatureVector('Dataset', *dataset_features).compute_blocks(self.documents, self.verbose, self.executor, self.blocks)
+        return {feature.key: self._rows(self.blocks[feature.key], row_ids) for feature in dataset_features}
+
+    @staticmethod
+    def _rows(block, row_ids):
+        return block[row_ids] if scipy.sparse.issparse(block) else block[row_ids, :]
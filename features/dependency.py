@@ -13,86 +13,91 @@
 #  limitations under the License.
 #
 
-import collections
-import operator
-import statistics
-from functools import reduce
-
 import nltk
+import numpy as np
 
-from features.feature import Feature
+from features.feature import ParserFeature
+from features.summary_statistics import HARMONIC, MAX, MEAN, MEDIAN_HIGH, VARIANCE, segment_statistics
+from parsers.cached_parser import CacheMissError
+from parsers.dependency_arcs import DependencyArcs
+from parsers.message_document import MessageDocument
 from parsers.nlp_parser import NlpParser
 
 
-class Dependency(Feature):
+class Dependency(ParserFeature):
     MODS = ['ROOT', 'acl', 'acl:relcl', 'advcl', 'advmod', 'amod', 'appos', 'aux', 'auxpass',
             'case', 'cc', 'cc:preconj', 'ccomp', 'compound', 'compound:prt', 'conj', 'cop',
             'csubj', 'csubjpass', 'dep', 'det', 'det:predet', 'discourse', 'dobj', 'expl',
             'iobj', 'mark', 'mwe', 'neg', 'nmod', 'nmod:npmod', 'nmod:poss', 'nmod:tmod',
             'nsubj', 'nsubjpass', 'nummod', 'parataxis', 'punct', 'root', 'xcomp']
+    MOD_IDS = {mod: i for i, mod in enumerate(MODS)}
+    STATISTICS = [MAX, MEAN, VARIANCE, HARMONIC, MEDIAN_HIGH]
+    batched = True
+    width = len(MODS) + len(STATISTICS) * 6
 
     def __init__(self, stanford_parser: NlpParser):
-        self.nlp_parser = stanford_parser
+        super().__init__(stanford_parser)
         nltk.download('punkt')
 
-    def get_features(self, message):
+    def get_features(self, document: MessageDocument):
+        return self.get_features_batch([document])[0].tolist()
+
+    def prepare(self, document: MessageDocument):
         try:
-            # Convert message to a list of separated sentences -
-            # it will be quicker to analyze separate sentences with nlp engine.
-            sentences = reduce(operator.concat, map(nltk.sent_tokenize, message.splitlines()))
-
-            try:
-                dependency_tree = self.nlp_parser.dependency_parse(message)
-            except Exception:
-                dependency_tree = reduce(operator.concat, map(self.nlp_parser.dependency_parse, sentences))
-
-            # Find all indices with ROOT element
-            root_indices = [i for i, (mod, _, _) in enumerate(dependency_tree) if mod == 'ROOT'] + [len(dependency_tree)]
-            # Split result to sentences with ROOT element at the beginning
-            sentences = [dependency_tree[s:e] for s, e in zip(root_indices[:-1], root_indices[1:])]
-
-            root_distance = list()
-            root_percentage = list()
-            sentence_max_distance = list()
-            sentence_max_distance_percentage = list()
-            root_children = list()
-            root_children_percentage = list()
-            histogram_mods = collections.Counter()
-            for sentence in sentences:
-                # Root distance
-                mod, parent, root_index = sentence[0]
-                distance = abs(parent - root_index)
-                root_distance.append(distance)
-                root_percentage.append(int(100 * (distance / len(sentence))))
-
-                # Root children
-                root_children_count = sum([1 for _, parent, _ in sentence if parent == root_index])
-                root_children.append(root_children_count)
-                root_children_percentage.append(int(100 * (root_children_count / len(sentence))))
-
-                # Sentence
-                max_distance = max([abs(parent - index) for _, parent, index in sentence])
-                sentence_max_distance.append(max_distance)
-                sentence_max_distance_percentage.append(int(100 * (max_distance / len(sentence))))
-
-                # Count mods
-                histogram_mods.update([mod for mod, _, _ in sentence])
-
-            histogram_mods_sparse = [histogram_mods[mod] if mod in histogram_mods else 0 for mod in self.MODS]
-
-            return histogram_mods_sparse + reduce(operator.concat,
-                                                  map(self._statistic_features,
-                                                      [root_distance, root_percentage,
-                                                       sentence_max_distance, sentence_max_distance_percentage,
-                                                       root_children, root_children_percentage]))
+            document.annotation(self.nlp_parser).dependencies
+        except CacheMissError:
+            raise
         except Exception:
-            return (len(self.MODS) + len(self._statistic_features([1, 2, 3])) * 6) * [0]
-
-    @staticmethod
-    def _statistic_features(values):
-        max_value = max(values)
-        mean = statistics.mean(values)
-        variance = statistics.variance(values) if len(values) > 1 else 0
-        harmonic = statistics.harmonic_mean(values)
-        median_high = statistics.median_high(values)
-        return [max_value, mean, variance, harmonic, median_high]
+            pass
+
+    def get_features_batch(self, documents):
+        parses = [self._arcs(document) for document in documents]
+
+        # Messages that could not be parsed or have no sentences get a row of zeros
+        rows = np.zeros((len(documents), self.width))
+        measured = [i for i, arcs in enumerate(parses) if arcs is not None and arcs.sentences_count > 0]
+        if not measured:
+            return rows
+        parses = [parses[i] for i in measured]
+
+        # Arcs of the sentences of all the messages, in one set of columns
+        heads = np.concatenate([arcs.heads[arcs.offsets[0]:arcs.offsets[-1]] for arcs in parses]).astype(np.int64)
+        dependents = np.concatenate([arcs.dependents[arcs.offsets[0]:arcs.offsets[-1]] for arcs in parses]).astype(np.int64)
+        mods = np.concatenate([self._mod_ids(arcs)[arcs.relations[arcs.offsets[0]:arcs.offsets[-1]]] for arcs in parses])
+        sentence_lengths = np.concatenate([np.diff(arcs.offsets) for arcs in parses])
+        sentence_starts = np.concatenate(([0], np.cumsum(sentence_lengths)[:-1]))
+        message_offsets = np.concatenate(([0], np.cumsum([arcs.sentences_count for arcs in parses])))
+
+        # Every sentence starts with its ROOT arc
+        distances = np.abs(heads - dependents)
+        root_distance = distances[sentence_starts]
+        root_children = np.add.reduceat(heads == np.repeat(dependents[sentence_starts], sentence_lengths), sentence_starts)
+        sentence_max_distance = np.maximum.reduceat(distances, sentence_starts)
+
+        def percentage(values):
+            return np.trunc(100 * (values / sentence_lengths))
+
+        metrics = [root_distance, percentage(root_distance), sentence_max_distance, percentage(sentence_max_distance),
+                   root_children, percentage(root_children)]
+        statistics = [segment_statistics(metric.astype(np.float64), message_offsets, self.STATISTICS) for metric in metrics]
+
+        # Count mods
+        arc_messages = np.repeat(np.arange(len(parses)), np.add.reduceat(sentence_lengths, message_offsets[:-1]))
+        known = mods >= 0
+        histogram_mods = np.bincount(arc_messages[known] * len(self.MODS) + mods[known],
+                                     minlength=len(parses) * len(self.MODS)).reshape(len(parses), len(self.MODS))
+
+        rows[measured] = np.hstack([histogram_mods] + statistics)
+        return rows
+
+    def _arcs(self, document: MessageDocument):
+        try:
+            return DependencyArcs.of(document.annotation(self.nlp_parser).dependencies)
+        except CacheMissError:
+            raise
+        except Exception:
+            return None
+
+    def _mod_ids(self, arcs: DependencyArcs):
+        # Index of every relation name of the parse in MODS (-1 - not counted)
+        return np.array([self.MOD_IDS.get(name, -1) for name in arcs.names], dtype=np.int64)
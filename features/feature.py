@@ -15,9 +15,55 @@
 
 from abc import ABC, abstractmethod
 
+import numpy as np
+
+from parsers.message_document import MessageDocument
+from parsers.nlp_parser import NlpParser
+
 
 class Feature(ABC):
+    # Batched features compute the rows of all the messages in one get_features_batch call
+    batched = False
+    # Sparse features return scipy.sparse rows from get_features_batch
+    sparse = False
+    # Fitted features have columns that depend on the training messages (e.g. a vocabulary)
+    fitted = False
+
+    @property
+    @abstractmethod
+    def width(self):
+        # Number of columns of the feature row
+        pass
+
+    @property
+    def key(self):
+        # Features with equal keys compute the same columns for the same messages
+        return type(self)
 
     @abstractmethod
-    def get_features(self, message):
+    def get_features(self, document: MessageDocument):
+        pass
+
+    def get_features_batch(self, documents):
+        return np.array([self.get_features(document) for document in documents], dtype=np.float64)
+
+    def prepare(self, document: MessageDocument):
+        # Per message work of a batched feature (e.g. fetching annotations), runs in the thread pool
+        # before get_features_batch
+        pass
+
+    def prefetch(self, documents):
         pass
+
+
+class ParserFeature(Feature):
+
+    def __init__(self, stanford_parser: NlpParser):
+        self.nlp_parser = stanford_parser
+
+    @property
+    def key(self):
+        return type(self), self.nlp_parser
+
+    def prefetch(self, documents):
+        self.nlp_parser.prefetch(documents)
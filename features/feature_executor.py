@@ -0,0 +1,109 @@
+#  Copyright (C) 2019 Oleg Shnaydman, Victoria Smolensky
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+
+import multiprocessing
+import os
+import pickle
+from abc import ABC, abstractmethod
+from multiprocessing.pool import ThreadPool
+
+EXECUTOR_THREAD = 'thread'
+EXECUTOR_PROCESS = 'process'
+EXECUTOR_HYBRID = 'hybrid'
+EXECUTOR_CHOICES = [EXECUTOR_THREAD, EXECUTOR_PROCESS, EXECUTOR_HYBRID]
+
+# Features of the current worker process, shipped once by the pool initializer
+_worker_features = None
+
+
+def prepare_documents(features, documents):
+    for document in documents:
+        for feature in features:
+            feature.prepare(document)
+    return documents
+
+
+def compute_blocks(features, documents):
+    prepare_documents(features, documents)
+    return [feature.get_features_batch(documents) for feature in features]
+
+
+def fork_context():
+    # Forked workers inherit the objects of this process (parsers, features, dataset blocks) without pickling
+    return multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else None)
+
+
+def _init_worker(features):
+    global _worker_features
+    _worker_features = pickle.loads(features) if isinstance(features, bytes) else features
+
+
+def _compute_worker_blocks(documents):
+    return compute_blocks(_worker_features, documents)
+
+
+class FeatureExecutor(ABC):
+    # Defaults: workers - at least this number (or the number of cores), documents per chunk
+    min_workers = 1
+    default_chunk_size = 64
+
+    def __init__(self, workers: int = None, chunk_size: int = None):
+        self.workers = workers or max(self.min_workers, os.cpu_count() or 1)
+        self.chunk_size = chunk_size or self.default_chunk_size
+
+    @abstractmethod
+    def map_chunks(self, features, documents):
+        # Yields the blocks (one per feature) of every chunk of the documents, in the documents order
+        pass
+
+    def _chunks(self, documents):
+        return [documents[i:i + self.chunk_size] for i in range(0, len(documents), self.chunk_size)]
+
+    @staticmethod
+    def create(name: str, workers: int = None, chunk_size: int = None):
+        executors = {EXECUTOR_THREAD: ThreadExecutor, EXECUTOR_PROCESS: ProcessExecutor, EXECUTOR_HYBRID: HybridExecutor}
+        return executors[name](workers, chunk_size)
+
+
+class ThreadExecutor(FeatureExecutor):
+    # Annotations I/O and features computation in threads of this process (CPU work is serialized by the GIL).
+    # Threads mostly wait for the nlp servers, so there are more of them than cores, with small chunks to keep them all busy.
+    min_workers = 8
+    default_chunk_size = 4
+
+    def map_chunks(self, features, documents):
+        with ThreadPool(self.workers) as pool:
+            yield from pool.imap(lambda chunk: compute_blocks(features, chunk), self._chunks(documents))
+
+
+class ProcessExecutor(FeatureExecutor):
+    # Annotations I/O and features computation in worker processes.
+    # Workers are forked, so features keep their nlp parser (and its cache store, which is reopened per process).
+
+    def map_chunks(self, features, documents):
+        with fork_context().Pool(self.workers, initializer=_init_worker, initargs=(features,)) as pool:
+            yield from pool.imap(_compute_worker_blocks, self._chunks(documents))
+
+
+class HybridExecutor(FeatureExecutor):
+    # Annotations I/O in threads of this process, features computation in worker processes.
+    # Documents are sent to the workers with their annotations and the features are pickled once without their nlp parser.
+
+    def map_chunks(self, features, documents):
+        with multiprocessing.Pool(self.workers, initializer=_init_worker, initargs=(pickle.dumps(features),)) as pool, \
+                ThreadPool(self.workers) as threads:
+            prepared = threads.imap(lambda chunk: prepare_documents(features, chunk), self._chunks(documents))
+            yield from pool.imap(_compute_worker_blocks, prepared)
@@ -13,28 +13,103 @@
 #  limitations under the License.
 #
 
-import operator
-from functools import reduce
-from multiprocessing.pool import ThreadPool
-
+import numpy as np
+import scipy.sparse
 from tqdm import tqdm
 
+from features.feature_executor import FeatureExecutor, ThreadExecutor
+from parsers.message_document import MessageDocument
+
 
 class FeatureVector:
 
-    def __init__(self, name, *features):
+    def __init__(self, name, *features, dtype=np.float64):
         self.name = name
         self.features = list(features)
+        self.dtype = dtype
+
+    @property
+    def offsets(self):
+        # Column offsets of the features in the vector, the last offset is the vector width
+        return np.cumsum([0] + [feature.width for feature in self.features])
+
+    @property
+    def width(self):
+        return int(self.offsets[-1])
+
+    def convert_to_features(self, data: list, verbose, executor: FeatureExecutor = None, blocks: dict = None):
+        # Messages are preprocessed once and the document is shared by all the features
+        documents = list(map(MessageDocument.of, data))
+
+        # Blocks (columns of a feature) of the same messages can be shared by feature vectors, by feature key.
+        # Only features without a block are computed.
+        blocks = dict() if blocks is None else blocks
+        missing = self._missing(blocks)
+        matrix = self._compute(missing, documents, verbose, executor, blocks)
+
+        # All the features were just computed into one dense matrix
+        if len(missing) == len(self.features) and not any(feature.sparse for feature in self.features):
+            return matrix
+
+        vector_blocks = [blocks[feature.key] for feature in self.features]
+        if any(feature.sparse for feature in self.features):
+            return scipy.sparse.hstack(vector_blocks, format='csr', dtype=self.dtype)
+        return np.hstack(vector_blocks).astype(self.dtype, copy=False)
+
+    def iter_batches(self, data: list, batch_size: int, executor: FeatureExecutor = None, blocks: dict = None, order=None):
+        # Feature matrices of consecutive batches of the messages (in the given order of their indices),
+        # computed batch by batch. Rows of blocks that are already computed are only selected.
+        documents = list(map(MessageDocument.of, data))
+        order = np.arange(len(documents)) if order is None else np.asarray(order)
+        for start in range(0, len(order), batch_size):
+            rows = order[start:start + batch_size]
+            batch_blocks = {key: block[rows] for key, block in blocks.items()} if blocks else None
+            yield rows, self.convert_to_features([documents[row] for row in rows], False, executor, batch_blocks)
+
+    def compute_blocks(self, data: list, verbose, executor: FeatureExecutor = None, blocks: dict = None):
+        # Blocks of all the features (by feature key), without building the vector
+        documents = list(map(MessageDocument.of, data))
+        blocks = dict() if blocks is None else blocks
+        self._compute(self._missing(blocks), documents, verbose, executor, blocks)
+        return blocks
+
+    def _missing(self, blocks: dict):
+        return list({feature.key: feature for feature in self.features if feature.key not in blocks}.values())
+
+    def _compute(self, features, documents, verbose, executor: FeatureExecutor, blocks: dict):
+        for feature in features:
+            feature.prefetch(documents)
+
+        # Dense features are written into their columns of one preallocated matrix,
+        # sparse features are kept sparse.
+        dense_features = [feature for feature in features if not feature.sparse]
+        dense_offsets = np.cumsum([0] + [feature.width for feature in dense_features])
+        columns = {feature: slice(start, end) for feature, start, end in zip(dense_features, dense_offsets[:-1], dense_offsets[1:])}
+        matrix = np.zeros((len(documents), dense_offsets[-1]), dtype=self.dtype)
+        sparse_blocks = {feature: list() for feature in features if feature.sparse}
 
-    def convert_to_features(self, data: list, verbose):
-        pool = ThreadPool(8)
-        if verbose:
-            features = list(tqdm(pool.imap(self._build_vector, data), total=len(data)))
-        else:
-            features = list(pool.map(self._build_vector, data))
-        pool.close()
+        # The executor prepares (annotations I/O) and computes the features of chunks of messages
+        executor = executor or ThreadExecutor()
+        progress = tqdm(total=len(documents)) if verbose else None
+        start = 0
+        if documents and features:
+            for chunk_blocks in executor.map_chunks(features, documents):
+                end = start + chunk_blocks[0].shape[0]
+                for feature, block in zip(features, chunk_blocks):
+                    if feature.sparse:
+                        sparse_blocks[feature].append(block)
+                    else:
+                        matrix[start:end, columns[feature]] = block
+                if progress is not None:
+                    progress.update(end - start)
+                start = end
+        if progress is not None:
+            progress.close()
 
-        return features
+        for feature in features:
+            blocks[feature.key] = self._sparse_block(feature, sparse_blocks[feature]) if feature.sparse else matrix[:, columns[feature]]
+        return matrix
 
-    def _build_vector(self, data_element):
-        return reduce(operator.concat, map(lambda feature: feature.get_features(data_element), self.features))
+    @staticmethod
+    def _sparse_block(feature, chunks):
+        return scipy.sparse.vstack(chunks, format='csr') if chunks else scipy.sparse.csr_matrix((0, feature.width))
@@ -13,35 +13,146 @@
 #  limitations under the License.
 #
 
-import collections
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
 
 from features.feature import Feature
+from features.ngram_encoder import NgramEncoder, NgramIndex, message_ngrams
+from parsers.message_document import MessageDocument
 
 
 class Unigram(Feature):
+    batched = True
+    sparse = True
+    fitted = True
 
-    def __init__(self, messages):
-        self.unigrams = set()
-        for message in messages:
-            self.unigrams.update(list(message))
+    # With an index of the dataset, messages are the row ids of the training messages
+    def __init__(self, messages, index: NgramIndex = None):
+        self.index = index
+        if index is None:
+            self.unigrams = set()
+            for message in messages:
+                self.unigrams.update(message)
 
-        self.unigrams = sorted(self.unigrams)
+            self.unigrams = sorted(self.unigrams)
+            self.columns = None
+        else:
+            self.columns = index.columns_of(messages)
+            self.unigrams = index.vocabulary_of(self.columns)
 
-    def get_features(self, message):
-        histogram = collections.Counter(message)
-        return [histogram[ch] if ch in histogram else 0 for ch in self.unigrams]
+        self._set_vocabulary(self.unigrams)
+
+    @classmethod
+    def from_vocabulary(cls, vocabulary):
+        # Feature of a fitted (e.g. saved) vocabulary, without training messages
+        feature = cls.__new__(cls)
+        feature.index = None
+        feature.columns = None
+        feature._set_vocabulary(list(vocabulary))
+        return feature
+
+    def _set_vocabulary(self, unigrams):
+        self.unigrams = unigrams
+        self.encoder = NgramEncoder(1, self.unigrams)
+        self._vocabulary_hash = hash(tuple(self.unigrams))
+
+    @property
+    def width(self):
+        return len(self.unigrams)
+
+    @property
+    def key(self):
+        return type(self), self.width, self._vocabulary_hash
+
+    def get_features(self, document: MessageDocument):
+        return self.get_features_batch([document]).toarray()[0].tolist()
+
+    def get_features_batch(self, documents):
+        row_ids = [document.row_id for document in documents]
+        if self.index is not None and None not in row_ids:
+            return self.index.counts_of(row_ids, self.columns)
+        return self.encoder.count([document.message for document in documents])
 
 
 class Ngram(Feature):
+    batched = True
+    sparse = True
+    fitted = True
+
+    # With an index of the dataset, messages are the row ids of the training messages
+    def __init__(self, n, messages, index: NgramIndex = None):
+        self.index = index
+        if index is None:
+            self.ngrams = set()
+            for message in messages:
+                self.ngrams.update(message_ngrams(message, n))
 
-    def __init__(self, n, messages):
-        self.ngrams = set()
-        for message in messages:
-            self.ngrams.update([message[i:i + n] for i in range(len(message) - n + 1)])
+            self.ngrams = sorted(self.ngrams)
+            self.columns = None
+        else:
+            self.columns = index.columns_of(messages)
+            self.ngrams = index.vocabulary_of(self.columns)
 
-        self.ngrams = sorted(self.ngrams)
         self.n = n
+        self._set_vocabulary(self.ngrams)
+
+    @classmethod
+    def from_vocabulary(cls, n, vocabulary):
+        # Feature of a fitted (e.g. saved) vocabulary, without training messages
+        feature = cls.__new__(cls)
+        feature.index = None
+        feature.columns = None
+        feature.n = n
+        feature._set_vocabulary(list(vocabulary))
+        return feature
+
+    def _set_vocabulary(self, ngrams):
+        self.ngrams = ngrams
+        self.encoder = NgramEncoder(self.n, self.ngrams)
+        self._vocabulary_hash = hash(tuple(self.ngrams))
+
+    @property
+    def width(self):
+        return len(self.ngrams)
+
+    @property
+    def key(self):
+        return type(self), self.n, self.width, self._vocabulary_hash
+
+    def get_features(self, document: MessageDocument):
+        return self.get_features_batch([document]).toarray()[0].tolist()
+
+    def get_features_batch(self, documents):
+        row_ids = [document.row_id for document in documents]
+        if self.index is not None and None not in row_ids:
+            return self.index.counts_of(row_ids, self.columns)
+        return self.encoder.count([document.message for document in documents])
+
+
+class HashedNgram(Feature):
+    batched = True
+    sparse = True
+
+    # Character n-grams (of all lengths in n_range) hashed into a fixed number of buckets.
+    # No vocabulary is fitted, so rows don't depend on the training messages and the width never grows.
+    # Signed hashing (alternate_sign) lets colliding n-grams cancel out instead of adding up.
+    def __init__(self, n_range=(1, 3), buckets=2 ** 18, signed=True):
+        self.n_range = tuple(n_range)
+        self.buckets = buckets
+        self.signed = signed
+        self.vectorizer = HashingVectorizer(analyzer='char', ngram_range=self.n_range, n_features=buckets, alternate_sign=signed,
+                                            norm=None, lowercase=False, dtype=np.float64)
+
+    @property
+    def width(self):
+        return self.buckets
+
+    @property
+    def key(self):
+        return type(self), self.n_range, self.buckets, self.signed
+
+    def get_features(self, document: MessageDocument):
+        return self.get_features_batch([document]).toarray()[0].tolist()
 
-    def get_features(self, message):
-        histogram = collections.Counter([message[i:i + self.n] for i in range(len(message) - self.n + 1)])
-        return [histogram[ngram] if ngram in histogram else 0 for ngram in self.ngrams]
+    def get_features_batch(self, documents):
+        return self.vectorizer.transform([document.message for document in documents])
@@ -13,35 +13,25 @@
 #  limitations under the License.
 #
 
-import operator
-import statistics
-from functools import reduce
-
-import nltk
-
 from features.feature import Feature
+from features.summary_statistics import ALL_STATISTICS, batch_statistics
+from parsers.message_document import MessageDocument
 
 
 class MessageLength(Feature):
+    width = 1
 
-    def get_features(self, message):
-        return [len(message)]
+    def get_features(self, document: MessageDocument):
+        return [len(document.message)]
 
 
 class SentenceLength(Feature):
+    batched = True
+    width = len(ALL_STATISTICS)
+
+    def get_features(self, document: MessageDocument):
+        return self.get_features_batch([document])[0].tolist()
 
-    def get_features(self, message):
-        sentences = reduce(operator.concat, map(nltk.sent_tokenize, message.splitlines()))
-        sentences_length = list(map(len, sentences))
-
-        return self._statistic_features(sentences_length)
-
-    @staticmethod
-    def _statistic_features(values):
-        max_value = max(values)
-        mean = statistics.mean(values)
-        variance = statistics.variance(values) if len(values) > 1 else 0
-        harmonic = statistics.harmonic_mean(values)
-        median = statistics.median(values)
-        median_high = statistics.median_high(values)
-        return [max_value, mean, variance, harmonic, median, median_high]
+    def get_features_batch(self, documents):
+        # max, mean, variance, harmonic, median and median_high of the sentences length of every message
+        return batch_statistics([list(map(len, document.sentences)) for document in documents], ALL_STATISTICS)
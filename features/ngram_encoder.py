@@ -0,0 +1,68 @@
+#  Copyright (C) 2019 Oleg Shnaydman, Victoria Smolensky
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+
+import numpy as np
+import scipy.sparse
+
+
+def message_ngrams(message, n):
+    return [message[i:i + n] for i in range(len(message) - n + 1)] if n > 1 else list(message)
+
+
+# Maps a fixed n-gram vocabulary to integer ids once and counts the n-grams of a whole list of messages in one call.
+# Each message costs O(message length) instead of O(vocabulary size).
+class NgramEncoder:
+
+    def __init__(self, n, vocabulary):
+        self.n = n
+        self.vocabulary = vocabulary
+        self.ids = {ngram: i for i, ngram in enumerate(vocabulary)}
+
+    def encode(self, message):
+        ids = self.ids
+        return np.fromiter((ids[ngram] for ngram in message_ngrams(message, self.n) if ngram in ids), dtype=np.int64)
+
+    def count(self, messages, dtype=np.float64):
+        encoded = [self.encode(message) for message in messages]
+        indptr = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(ids) for ids in encoded], out=indptr[1:])
+        indices = np.concatenate(encoded) if encoded else np.zeros(0, dtype=np.int64)
+
+        # Duplicate (row, id) entries are summed into counts
+        counts = scipy.sparse.csr_matrix((np.ones(len(indices), dtype=dtype), indices, indptr),
+                                         shape=(len(encoded), len(self.vocabulary)))
+        counts.sum_duplicates()
+        return counts
+
+
+class NgramIndex:
+    # N-gram counts of all the messages of a dataset over one sorted vocabulary of all their n-grams.
+    # The vocabulary of some of the messages (and their counts over it) is derived from the index without tokenizing them again.
+
+    def __init__(self, n, messages):
+        self.n = n
+        self.vocabulary = sorted({ngram for message in messages for ngram in message_ngrams(message, n)})
+        self.counts = NgramEncoder(n, self.vocabulary).count(messages)
+
+    def columns_of(self, row_ids):
+        # Sorted vocabulary ids of all the n-grams of the messages
+        return np.unique(self.counts[row_ids].indices)
+
+    def vocabulary_of(self, columns):
+        return [self.vocabulary[column] for column in columns]
+
+    def counts_of(self, row_ids, columns):
+        return self.counts[row_ids][:, columns]
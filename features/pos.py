@@ -15,21 +15,26 @@
 
 import collections
 
-from features.feature import Feature
+from features.feature import ParserFeature
+from parsers.message_document import MessageDocument
 from parsers.nlp_parser import NlpParser
 
 
-class PartOfSpeechTags(Feature):
+class PartOfSpeechTags(ParserFeature):
 
     POS_TAGS = ['CC', 'CD', 'DT', 'EX', 'FW', 'IN', 'JJ', 'JJR', 'JJS', 'LS',
                 'MD', 'NN', 'NNS', 'NNP', 'NNPS', 'PDT', 'POS', 'PRP', 'PRP$',
                 'RB', 'RBR', 'RBS', 'RP', 'SYM', 'TO', 'UH', 'VB', 'VBD', 'VBG',
                 'VBN', 'VBP', 'VBZ', 'WDT', 'WP', 'WP$', 'WRB']
+    width = len(POS_TAGS)
 
     def __init__(self, stanford_parser: NlpParser):
-        self.nlp_parser = stanford_parser
+        super().__init__(stanford_parser)
 
-    def get_features(self, message):
-        tags = [y for x, y in self.nlp_parser.pos_tag(message)]
+    def prepare(self, document: MessageDocument):
+        document.annotation(self.nlp_parser).pos_tags
+
+    def get_features(self, document: MessageDocument):
+        tags = [y for x, y in document.annotation(self.nlp_parser).pos_tags]
         histogram = collections.Counter(tags)
         return [histogram[tag] if tag in histogram else 0 for tag in self.POS_TAGS]
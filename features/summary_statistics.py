@@ -0,0 +1,74 @@
+#  Copyright (C) 2019 Oleg Shnaydman, Victoria Smolensky
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+
+import numpy as np
+
+MAX = 'max'
+MEAN = 'mean'
+VARIANCE = 'variance'
+HARMONIC = 'harmonic'
+MEDIAN = 'median'
+MEDIAN_HIGH = 'median_high'
+
+ALL_STATISTICS = [MAX, MEAN, VARIANCE, HARMONIC, MEDIAN, MEDIAN_HIGH]
+
+
+def batch_statistics(values_lists, statistics=ALL_STATISTICS):
+    # Summary statistics of many ragged value lists at once (one row per list, one column per statistic)
+    lengths = np.fromiter(map(len, values_lists), dtype=np.int64, count=len(values_lists))
+    flat = np.fromiter((value for values in values_lists for value in values), dtype=np.float64, count=int(lengths.sum()))
+    offsets = np.zeros(len(values_lists) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return segment_statistics(flat, offsets, statistics)
+
+
+def segment_statistics(flat, offsets, statistics=ALL_STATISTICS):
+    # Same values as the statistics module (max, mean, sample variance, harmonic mean, median, median_high)
+    # for every segment flat[offsets[i]:offsets[i + 1]]. All segments must be non-empty and values non-negative.
+    lengths = np.diff(offsets)
+    if np.any(lengths == 0):
+        raise ValueError('statistics of an empty list')
+    starts = offsets[:-1]
+    segment_ids = np.repeat(np.arange(len(lengths)), lengths)
+
+    # Sort values inside each segment (segments keep their order)
+    ordered = flat[np.lexsort((flat, segment_ids))]
+    sums = np.add.reduceat(flat, starts) if len(flat) else np.zeros(0)
+    means = sums / lengths
+
+    columns = list()
+    for statistic in statistics:
+        if statistic == MAX:
+            columns.append(ordered[offsets[1:] - 1])
+        elif statistic == MEAN:
+            columns.append(means)
+        elif statistic == VARIANCE:
+            squares = np.add.reduceat((flat - means[segment_ids]) ** 2, starts) if len(flat) else np.zeros(0)
+            columns.append(np.where(lengths > 1, squares / np.maximum(lengths - 1, 1), 0.0))
+        elif statistic == HARMONIC:
+            # Harmonic mean of a list with a zero is zero
+            has_zero = np.add.reduceat((flat == 0).astype(np.int64), starts) > 0 if len(flat) else np.zeros(0, dtype=bool)
+            with np.errstate(divide='ignore'):
+                inverse_sums = np.add.reduceat(np.where(flat == 0, 0.0, 1 / flat), starts) if len(flat) else np.zeros(0)
+            columns.append(np.where(has_zero, 0.0, lengths / np.where(has_zero, 1.0, inverse_sums)))
+        elif statistic == MEDIAN:
+            columns.append((ordered[starts + (lengths - 1) // 2] + ordered[starts + lengths // 2]) / 2)
+        elif statistic == MEDIAN_HIGH:
+            columns.append(ordered[starts + lengths // 2])
+        else:
+            raise ValueError(f'unknown statistic: {statistic}')
+
+    return np.column_stack(columns) if columns else np.zeros((len(lengths), 0))
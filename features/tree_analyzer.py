@@ -0,0 +1,89 @@
+#  Copyright (C) 2019 Oleg Shnaydman, Victoria Smolensky
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+
+import collections
+import re
+
+# Same tokens as nltk Tree.fromstring: brackets, node labels and leaves
+TOKEN_PATTERN = re.compile(r'\(|\)|[^\s()]+')
+
+TreeAnalysis = collections.namedtuple('TreeAnalysis', ['depth', 'width', 'length', 'tags', 'tags_width'])
+
+
+# Single scan of a bracketed constituency tree string, without building an nltk Tree.
+# Results are the same as the nltk Tree based measures:
+# depth - number of tree levels (root is level 1),
+# width - length of the first child of the root,
+# length - number of leaves,
+# tags - labels (from tags) of all non-root nodes,
+# tags_width - number of children of all non-root nodes, by label (from tags).
+def analyze_tree(tree_str, tags):
+    # Stack of open nodes: [label, number of children, is first child of the root]
+    stack = list()
+    depth = 0
+    length = 0
+    width = None
+    is_closed = False
+    tags_present = set()
+    tags_width = collections.Counter()
+    expect_label = False
+
+    for token in TOKEN_PATTERN.findall(tree_str):
+        if expect_label:
+            expect_label = False
+            if token != '(' and token != ')':
+                stack[-1][0] = token
+                continue
+
+        if token == '(':
+            if is_closed:
+                raise ValueError(f'extra tree in: {tree_str!r}')
+            is_root_child = False
+            if stack:
+                parent = stack[-1]
+                parent[1] += 1
+                is_root_child = len(stack) == 1 and parent[1] == 1
+            stack.append([None, 0, is_root_child])
+            expect_label = True
+            if len(stack) > depth:
+                depth = len(stack)
+        elif token == ')':
+            if not stack:
+                raise ValueError(f'unexpected close bracket in: {tree_str!r}')
+            label, children, is_root_child = stack.pop()
+            if not stack:
+                is_closed = True
+            elif label in tags:
+                tags_present.add(label)
+                tags_width[label] += children
+            if is_root_child:
+                width = children
+        else:
+            if not stack:
+                raise ValueError(f'leaf outside of the tree in: {tree_str!r}')
+            parent = stack[-1]
+            parent[1] += 1
+            length += 1
+            if len(stack) == 1 and parent[1] == 1:
+                # First child of the root is a leaf - its width is the string length
+                width = len(token)
+
+    if stack or not is_closed:
+        raise ValueError(f'incomplete tree: {tree_str!r}')
+    if width is None:
+        raise IndexError(f'root without children: {tree_str!r}')
+
+    return TreeAnalysis(depth, width, length, tags_present, tags_width)
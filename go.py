@@ -14,21 +14,42 @@
 #
 
 import argparse
+import functools
+import json
 import os
+import random
+import sys
+import tempfile
 import traceback
+from collections import defaultdict
+from multiprocessing.pool import ThreadPool
 
-from classifiers.classifier import Classifier
-from classifiers.logistic_regression import LogisticRegressionClassifier
+import numpy as np
+import scipy.sparse
+from tqdm import tqdm
+
+from classifiers.classifier import Classifier, StreamingClassifier
+from classifiers.logistic_regression import LogisticRegressionClassifier, PENALTY_CHOICES, PENALTY_L1, PENALTY_L2, SOLVER_CHOICES, SOLVER_LIBLINEAR
+from classifiers.regularization_path import fit_path
+from classifiers.sgd import SgdLogisticClassifier
 from features.constituency import Constituency
 from features.dependency import Dependency
-from features.grams import Unigram, Ngram
+from features.grams import Unigram, Ngram, HashedNgram
 from features.length import SentenceLength, MessageLength
 from features.pos import PartOfSpeechTags
+from parsers.message_document import MessageDocument
 from parsers.nlp_parser import NlpParser
 from utils import csv_data_util, result_data_util
 from utils.csv_data_util import ClassifierData
+from utils.attribution_service import AuthorAttribution, attribution_json, serve
+from utils.experiment_scheduler import Job, expand_jobs, run_jobs
+from utils.model_bundle import ModelBundle
+from features.feature_executor import EXECUTOR_CHOICES, EXECUTOR_THREAD, FeatureExecutor, ThreadExecutor
+from features.dataset_features import DatasetFeatures
 from features.features_vector import FeatureVector
 from parsers.stanford_parser import StanfordParser
+from parsers.async_parser import AsyncParser
+from parsers.replay_parser import ReplayParser
 from utils.time_utils import Timer
 
 # os.environ['PATH'] += ':/usr/lib/jvm/jdk1.8.0_121/bin'
@@ -37,7 +58,22 @@ DATA_MOVIES_120 = 'movies_120'
 DATA_LEARN_PYTHON_500 = 'learn_python_500'
 DATA_DND_500 = 'dnd_500'
 
+CLASSIFIER_LOGISTIC = 'logistic'
+CLASSIFIER_SGD = 'sgd'
+CLASSIFIER_CHOICES = [CLASSIFIER_LOGISTIC, CLASSIFIER_SGD]
+
 VERBOSE = True
+# Number of buckets of hashed n-gram features that replace unigram and trigram features (0 - vocabulary based features)
+HASHED_BUCKETS = 0
+# Executor of features computation (threads, processes or both)
+FEATURE_EXECUTOR = ThreadExecutor()
+# Classifier type and size of the training batches of streaming classifiers (0 - train on the whole feature matrix)
+CLASSIFIER = CLASSIFIER_LOGISTIC
+BATCH_SIZE = 0
+# Regularization strength (inverse), penalty and solver of the logistic regression classifier
+LOGISTIC_C = 1.0
+LOGISTIC_PENALTY = PENALTY_L2
+LOGISTIC_SOLVER = SOLVER_LIBLINEAR
 
 FEATURES_ALL = 'all'
 FEATURES_COMBINED = 'combined'
@@ -52,31 +88,99 @@ FEATURES_SENTENCE_LENGTH = 'sentence_length'
 FEATURES_MESSAGE_LENGTH = 'message_length'
 FEATURES_UNIGRAM = 'unigram'
 FEATURES_TRIGRAM = 'trigram'
+FEATURES_HASHED = 'hashed'
 
 FEATURES_CHOICES = [FEATURES_ALL, FEATURES_COMBINED, FEATURES_SINGLES, FEATURES_GROUPS,
                     FEATURES_LEXICAL, FEATURES_SYNTACTIC, FEATURES_CONSTITUENCY, FEATURES_POS_TAG,
                     FEATURES_DEPENDENCY, FEATURES_SENTENCE_LENGTH, FEATURES_MESSAGE_LENGTH,
-                    FEATURES_UNIGRAM, FEATURES_TRIGRAM]
+                    FEATURES_UNIGRAM, FEATURES_TRIGRAM, FEATURES_HASHED]
 DATA_CHOICES = [DATA_MOVIES_120, DATA_LEARN_PYTHON_500, DATA_DND_500]
 
+PARSER_STANFORD = 'stanford'
+PARSER_ASYNC = 'async'
+PARSER_REPLAY = 'replay'
+PARSER_CHOICES = [PARSER_STANFORD, PARSER_ASYNC, PARSER_REPLAY]
+
+COMMAND_SERVER = 'server'
+COMMAND_PRECOMPUTE = 'precompute'
+COMMAND_TRAIN = 'train'
+COMMAND_PREDICT = 'predict'
+COMMAND_SERVE = 'serve'
+COMMAND_SWEEP = 'sweep'
+
+SERVER_START = 'start'
+SERVER_STOP = 'stop'
+SERVER_STATUS = 'status'
+SERVER_CHOICES = [SERVER_START, SERVER_STOP, SERVER_STATUS]
+
+
+def create_nlp_parser(options) -> NlpParser:
+    if options.parser == PARSER_REPLAY:
+        # Answers only from the cache - no nlp engine is started or used
+        return ReplayParser(data_set_name=options.data_name, single_request=options.single_request, strict=options.strict)
+
+    if options.parser == PARSER_ASYNC:
+        # Async client only connects to servers - running ones (-na) or persistent ones that it may start (-p)
+        daemon = StanfordParser.create_daemon(options.servers_num, idle_timeout=options.idle_timeout * 60) if options.persistent else None
+        return AsyncParser(data_set_name=options.data_name,
+                           is_cached=not options.no_cache,
+                           servers_num=options.servers_num,
+                           max_in_flight=options.max_in_flight,
+                           daemon=daemon)
 
-def main(no_auto_start: bool, not_cached: bool, data_set_name: str, features_type: str, users_min: int, users_max: int, num_iterations: int):
-    auto_start = not no_auto_start
-    cached = not not_cached
     # Initialize Stanford NLP
-    nlp_parser = StanfordParser(data_set_name=data_set_name, auto_start=auto_start, is_cached=cached)
+    return StanfordParser(data_set_name=options.data_name,
+                          auto_start=not options.no_auto_start,
+                          is_cached=not options.no_cache,
+                          single_request=options.single_request,
+                          servers_num=options.servers_num,
+                          persistent=options.persistent,
+                          idle_timeout=options.idle_timeout * 60)
 
+
+def main(nlp_parser: NlpParser, data_set_name: str, features_type: str, users_min: int, users_max: int, num_iterations: int,
+         dataset_wide: bool = False, workers: int = 1, folds: int = 0, seed: int = None):
     # Run style recognition
     print(f'data: {data_set_name}')
+    # Seeds of all the trials are drawn from this seed, so a run is repeated with the same -sd
+    seed = random.randrange(2 ** 32) if seed is None else seed
+    print(f'seed: {seed}')
     try:
+        # Features that don't depend on the training messages are computed once for the whole dataset
+        # (always in cross validation, so the folds share them and only fit their vocabularies)
+        dataset = None
+        if dataset_wide or folds:
+            messages = [message for _, message in csv_data_util.load_messages(data_set_name)]
+            dataset = DatasetFeatures(messages, FEATURE_EXECUTOR, VERBOSE)
+
+        # Every (users, iteration, fold, feature set) is a separate job with the seed of its (users, iteration) trial.
+        # Feature sets of an empty split only describe the feature sets - their vocabularies are empty, nothing is fitted.
+        empty_data = ClassifierData([], [], [], [], [], [])
+        feature_sets = get_features(nlp_parser, empty_data, features_type, dataset)
+        jobs = expand_jobs(users_min, users_max, num_iterations, len(feature_sets), folds, random.Random(seed))
+        if dataset is not None:
+            # Dataset features are computed before the workers start, so they share them
+            dataset.blocks_of([feature for features_vector in feature_sets for feature in features_vector.features], [])
+
+        run_job = functools.partial(run_experiment, nlp_parser, data_set_name, features_type, dataset, folds)
+        trials = defaultdict(lambda: defaultdict(dict))
+        # Whole trials (folds) are sent to the workers when there are enough of them, so their feature sets share blocks
+        trials_num = (users_max - users_min + 1) * num_iterations * max(folds, 1)
+        chunk_size = len(feature_sets) if trials_num >= workers else 1
+        with tqdm(total=len(jobs), desc='experiments', disable=workers <= 1) as progress:
+            for job, res_dict in run_jobs(run_job, jobs, workers, chunk_size):
+                trials[(job.users, job.iteration)][job.feature_set][job.fold] = res_dict
+                progress.update()
+
+        # Results of the feature sets of every trial (mean of the folds), in the order of the sweep
         dict_list = list()
-        for user_num in range(users_min, users_max + 1):
-            for _ in range(num_iterations):
-                # Load data
-                data = csv_data_util.load_classifier_data(data_set_name=data_set_name, users_num=user_num, test_ratio=0.3)
-                selected_features = get_features(nlp_parser, data, features_type)
-                res_dict = analyze(LogisticRegressionClassifier(), data, selected_features)
-                dict_list.append((user_num, res_dict))
+        for (user_num, _), trial in sorted(trials.items()):
+            res_dict = dict()
+            for feature_set in range(len(feature_sets)):
+                fold_results = [fold_res for _, fold_res in sorted(trial[feature_set].items(), key=lambda item: item[0] or 0)]
+                for name in fold_results[0]:
+                    res_dict[name] = sum(fold_res[name] for fold_res in fold_results) / len(fold_results)
+            dict_list.append((user_num, res_dict))
 
         result = result_data_util.merge_result(dict_list)
         result_data_util.print_result(result)
@@ -88,41 +192,271 @@ def main(no_auto_start: bool, not_cached: bool, data_set_name: str, features_typ
     nlp_parser.close()
 
 
-def analyze(classifier: Classifier, data: ClassifierData, features):
-    result_dict = dict()
+def create_classifier() -> Classifier:
+    if CLASSIFIER == CLASSIFIER_SGD:
+        return SgdLogisticClassifier()
+    return LogisticRegressionClassifier(LOGISTIC_C, LOGISTIC_PENALTY, LOGISTIC_SOLVER)
+
+
+def run_experiment(nlp_parser: NlpParser, data_set_name: str, features_type: str, dataset: DatasetFeatures, folds: int, job: Job):
+    # Analyze one feature set of a trial (or of a fold of the trial)
+    data, feature_sets, train_blocks, test_blocks = load_trial(nlp_parser, data_set_name, features_type, dataset, job.users, job.seed,
+                                                               folds, job.fold)
+    features_vector = feature_sets[job.feature_set]
+    res = train_test(features_vector, create_classifier(), data, train_blocks, test_blocks)
+    fold = '' if job.fold is None else f', fold: {job.fold + 1}/{folds}'
+    print(f'feature group: {features_vector.name}{fold}, f1-score: {res}')
+    return {features_vector.name: res}
+
+
+# Jobs of the same trial (fold) that run one after another in a process share its messages and feature blocks
+@functools.lru_cache(maxsize=1)
+def load_trial(nlp_parser: NlpParser, data_set_name: str, features_type: str, dataset: DatasetFeatures, users: int, seed: int,
+               folds: int = 0, fold: int = None):
+    random.seed(seed)
+    data = csv_data_util.load_classifier_data(data_set_name=data_set_name, users_num=users, test_ratio=0.3)
+    if fold is not None:
+        # Vocabulary features of the fold are fitted on its train messages from the dataset n-gram counts
+        data = csv_data_util.split_folds(data, folds, seed)[fold]
+    feature_sets = get_features(nlp_parser, data, features_type, dataset)
+    data, train_blocks, test_blocks = prepare_trial(data, feature_sets, dataset)
+    return data, feature_sets, train_blocks, test_blocks
+
+
+def precompute(nlp_parser: NlpParser, data_set_name: str, workers: int, chunk_size: int = 1000):
+    # Parse every message of the dataset once - results are written to the cache as they are produced,
+    # so an interrupted run continues from where it stopped.
+    messages = list(dict.fromkeys(message for _, message in csv_data_util.load_messages(data_set_name)))
+    print(f'data: {data_set_name}, messages: {len(messages)}')
+
+    failed = 0
+    not_stored = 0
+    pool = ThreadPool(workers)
+    try:
+        with tqdm(total=len(messages)) as progress:
+            for i in range(0, len(messages), chunk_size):
+                chunk = messages[i:i + chunk_size]
+                nlp_parser.prefetch(list(map(MessageDocument, chunk)))
+                annotated = list()
+                for message, succeeded in pool.imap_unordered(lambda message: (message, _annotate_all(nlp_parser, message)), chunk):
+                    if succeeded:
+                        annotated.append(message)
+                    else:
+                        failed += 1
+                    progress.update()
+                # Only annotations that reached the cache are parsed - a later (replay) run reads them from there
+                not_stored += sum(not stored for stored in pool.imap_unordered(lambda message: _is_stored(nlp_parser, message), annotated))
+    finally:
+        pool.close()
+        nlp_parser.close()
+
+    print(f'parsed: {len(messages) - failed - not_stored}, failed: {failed}, not stored: {not_stored}')
+    if not_stored:
+        sys.exit(f'{not_stored} annotated messages were not stored in the cache')
+
+
+def train(nlp_parser: NlpParser, data_set_name: str, features_type: str, users: int, model_file: str):
+    # Train one feature set on the messages of the selected users and save it as a model bundle
+    print(f'data: {data_set_name}')
+    try:
+        data = csv_data_util.load_classifier_data(data_set_name=data_set_name, users_num=users, test_ratio=0.3)
+        features_vector, = get_features(nlp_parser, data, features_type)
+        data, train_blocks, test_blocks = prepare_trial(data, [features_vector])
+        classifier = create_classifier()
+        res = train_test(features_vector, classifier, data, train_blocks, test_blocks)
+        print(f'feature group: {features_vector.name}, f1-score: {res}')
+
+        ModelBundle(features_vector, classifier, {'data': data_set_name, 'f1_micro': res}).save(model_file)
+        print(f'model: {model_file}')
+    finally:
+        nlp_parser.close()
+
 
-    # Parse and recognize style
-    for feature in features:
-        res = train_test(feature, classifier, data=data)
-        result_dict[feature.name] = res
-        print(f'feature group: {feature.name}, f1-score: {res}')
+def predict(nlp_parser: NlpParser, model_file: str, input_file: str, top_k: int):
+    # Top-k authors of the messages of the input (one message per line), as JSON lines
+    try:
+        attribution = AuthorAttribution(ModelBundle.load(model_file, nlp_parser), FEATURE_EXECUTOR)
+        with (sys.stdin if input_file == '-' else open(input_file)) as messages_file:
+            messages = [line.rstrip('\n') for line in messages_file if line.strip()]
+        for message, authors in zip(messages, attribution.top_authors(messages, top_k)):
+            print(json.dumps({'message': message, 'authors': attribution_json(authors)}))
+    finally:
+        nlp_parser.close()
 
-    return result_dict
 
+def serve_model(nlp_parser: NlpParser, model_file: str, port: int, top_k: int, cache_size: int):
+    # The parser, features and model stay loaded between requests
+    try:
+        attribution = AuthorAttribution(ModelBundle.load(model_file, nlp_parser), FEATURE_EXECUTOR, cache_size)
+        serve(attribution, port, top_k=top_k, verbose=VERBOSE)
+    finally:
+        nlp_parser.close()
 
-def train_test(features_vector: FeatureVector, classifier: Classifier, data: ClassifierData):
-    # Build train features vector
-    with Timer('building train features', VERBOSE):
-        x_train_features = features_vector.convert_to_features(data.x_train, VERBOSE)
 
-    # Train
-    with Timer('training', VERBOSE):
-        classifier.train(x_train_features, data.y_train)
+def sweep(nlp_parser: NlpParser, data_set_name: str, features_type: str, users: int, c_values: list, penalties: list, workers: int = 1):
+    # Regularization paths of every feature set and penalty on one train / test split
+    print(f'data: {data_set_name}')
+    try:
+        data = csv_data_util.load_classifier_data(data_set_name=data_set_name, users_num=users, test_ratio=0.3)
+        feature_sets = get_features(nlp_parser, data, features_type)
+        data, train_blocks, test_blocks = prepare_trial(data, feature_sets)
+
+        # Feature matrices are built once and shared by all the points of the grid (and the forked workers)
+        matrices = list()
+        for features_vector in feature_sets:
+            with Timer(f'building {features_vector.name} features', VERBOSE):
+                matrices.append((features_vector.convert_to_features(data.x_train, VERBOSE, FEATURE_EXECUTOR, train_blocks),
+                                 features_vector.convert_to_features(data.x_test, VERBOSE, FEATURE_EXECUTOR, test_blocks)))
+
+        # Paths run in parallel, the points of a path one after another from the previous point
+        paths = [(feature_set, penalty) for feature_set in range(len(feature_sets)) for penalty in penalties]
+        run_path = functools.partial(_sweep_path, matrices, data.y_train, data.y_test, c_values)
+        results = dict()
+        with tqdm(total=len(paths), desc='paths', disable=workers <= 1) as progress:
+            for path, points in run_jobs(run_path, paths, workers):
+                results[path] = points
+                progress.update()
+
+        result_data_util.print_sweep([(feature_sets[feature_set].name, point) for feature_set, penalty in paths
+                                      for point in results[(feature_set, penalty)]])
+    finally:
+        nlp_parser.close()
+
+
+def _sweep_path(matrices: list, y_train, y_test, c_values: list, path):
+    feature_set, penalty = path
+    x_train, x_test = matrices[feature_set]
+    return fit_path(x_train, y_train, x_test, y_test, penalty, c_values)
+
+
+def _is_stored(nlp_parser: NlpParser, message):
+    # The whole annotation of the message, or all of its separate annotations, are in the cache
+    if message in nlp_parser.document_cache:
+        return True
+    document = MessageDocument(message)
+    return message in nlp_parser.pos_cache and \
+        all(sentence in nlp_parser.constituency_cache for sentence in document.parse_sentences) and \
+        (message in nlp_parser.dependency_cache or all(sentence in nlp_parser.dependency_cache for sentence in document.sentences))
+
+
+def _annotate_all(nlp_parser: NlpParser, message):
+    try:
+        document = MessageDocument(message).annotation(nlp_parser)
+        # Access every annotation that the features use
+        return document.pos_tags is not None and document.trees is not None and document.dependencies is not None
+    except Exception:
+        return False
+
+
+def server(command: str, servers_num: int, idle_timeout: int):
+    daemon = StanfordParser.create_daemon(servers_num, idle_timeout=idle_timeout * 60, download=command == SERVER_START)
+    if command == SERVER_START:
+        daemon.acquire()
+        daemon.release()
+    elif command == SERVER_STOP:
+        daemon.stop()
+
+    status = daemon.status()
+    if status:
+        print(f'nlp engine servers: {status["servers"]}, running: {status["running"]}, clients: {status["clients"]}')
+    else:
+        print('nlp engine servers are not running')
+
+
+def prepare_trial(data: ClassifierData, features, dataset: DatasetFeatures = None):
+    # Feature groups share the blocks of their common features (per split), so every feature is computed once
+    if dataset is None:
+        # Preprocess messages once for all the feature groups
+        data = ClassifierData(list(map(MessageDocument, data.x_train)), data.y_train, list(map(MessageDocument, data.x_test)), data.y_test,
+                              data.train_ids, data.test_ids)
+        train_blocks = dict()
+        test_blocks = dict()
+    else:
+        # Messages and blocks of the dataset features are taken from the dataset by row ids
+        data = ClassifierData(dataset.documents_of(data.train_ids), data.y_train, dataset.documents_of(data.test_ids), data.y_test,
+                              data.train_ids, data.test_ids)
+        all_features = [feature for features_vector in features for feature in features_vector.features]
+        train_blocks = dataset.blocks_of(all_features, data.train_ids)
+        test_blocks = dataset.blocks_of(all_features, data.test_ids)
+
+    return data, train_blocks, test_blocks
+
+
+def train_test(features_vector: FeatureVector, classifier: Classifier, data: ClassifierData, train_blocks: dict = None,
+               test_blocks: dict = None):
+    if isinstance(classifier, StreamingClassifier) and BATCH_SIZE:
+        # Features of every batch (of random messages, train data is sorted by user) are built once and spilled to disk,
+        # so only one batch is in memory at a time. The classifier observes all the batches (e.g. their scales)
+        # before it is trained on them, every epoch in a new order.
+        y_train = np.asarray(data.y_train)
+        with tempfile.TemporaryDirectory(prefix='batches_') as batches_dir:
+            with Timer('building train features', VERBOSE):
+                order = random.sample(range(len(y_train)), len(y_train))
+                batches = list()
+                for rows, x_batch in features_vector.iter_batches(data.x_train, BATCH_SIZE, FEATURE_EXECUTOR, train_blocks, order):
+                    classifier.observe(x_batch)
+                    batches.append((rows, _save_batch(os.path.join(batches_dir, str(len(batches))), x_batch)))
+
+            with Timer('training', VERBOSE):
+                classes = np.unique(y_train)
+                for _ in range(classifier.epochs):
+                    for rows, batch_file in random.sample(batches, len(batches)):
+                        classifier.partial_fit(_load_batch(batch_file), y_train[rows], classes)
+    else:
+        # Build train features vector
+        with Timer('building train features', VERBOSE):
+            x_train_features = features_vector.convert_to_features(data.x_train, VERBOSE, FEATURE_EXECUTOR, train_blocks)
+
+        # Train
+        with Timer('training', VERBOSE):
+            classifier.train(x_train_features, data.y_train)
 
     # Build test features vector
     with Timer('building test features', VERBOSE):
-        x_test_features = features_vector.convert_to_features(data.x_test, VERBOSE)
+        x_test_features = features_vector.convert_to_features(data.x_test, VERBOSE, FEATURE_EXECUTOR, test_blocks)
 
-    # Test
+    # Test (all the metrics from a single prediction pass)
+    evaluation = classifier.evaluate(x_test_features, data.y_test)
     if VERBOSE:
         print(features_vector.name)
-        print(classifier.report(x_test_features, data.y_test))
+        print(evaluation.report)
+        print(f'confusion matrix (rows: true, columns: predicted - {", ".join(evaluation.labels)}):')
+        print(evaluation.confusion_matrix)
 
-    return classifier.f1_micro(x_test_features, data.y_test)
+    return evaluation.f1_micro
 
 
-def get_features(nlp_parser: NlpParser, data: ClassifierData, features: str):
-    # Initialize features
+def _save_batch(path: str, x_batch):
+    # Batches are stored as they were built - dense, or sparse when the feature set has sparse features
+    if scipy.sparse.issparse(x_batch):
+        scipy.sparse.save_npz(path, x_batch, compressed=False)
+        return path + '.npz'
+    np.save(path, x_batch)
+    return path + '.npy'
+
+
+def _load_batch(batch_file: str):
+    return scipy.sparse.load_npz(batch_file) if batch_file.endswith('.npz') else np.load(batch_file)
+
+
+def vocabulary_feature(n: int, data: ClassifierData, dataset: DatasetFeatures, vocabulary: dict):
+    # Unigram (n = 1) or n-gram feature of the split, fitted on its first use and shared by all the feature groups of the split
+    if n not in vocabulary:
+        if HASHED_BUCKETS:
+            vocabulary[n] = HashedNgram((n, n), HASHED_BUCKETS)
+        elif n == 1:
+            vocabulary[n] = Unigram(data.train_ids, dataset.ngram_index(1)) if dataset else Unigram(data.x_train)
+        else:
+            vocabulary[n] = Ngram(n, data.train_ids, dataset.ngram_index(n)) if dataset else Ngram(n, data.x_train)
+    return vocabulary[n]
+
+
+def get_features(nlp_parser: NlpParser, data: ClassifierData, features: str, dataset: DatasetFeatures = None, vocabulary: dict = None):
+    # Initialize features - vocabulary features (by n) are fitted once for all the feature groups of the split
+    vocabulary = dict() if vocabulary is None else vocabulary
+    unigram = functools.partial(vocabulary_feature, 1, data, dataset, vocabulary)
+    trigram = functools.partial(vocabulary_feature, 3, data, dataset, vocabulary)
+
     if features == FEATURES_ALL:
         return [
             FeatureVector('All',
@@ -131,19 +465,19 @@ def get_features(nlp_parser: NlpParser, data: ClassifierData, features: str):
                           Dependency(nlp_parser),
                           SentenceLength(),
                           MessageLength(),
-                          Unigram(data.x_train),
-                          Ngram(3, data.x_train))
+                          unigram(),
+                          trigram())
         ]
 
     if features == FEATURES_COMBINED:
         return [
             FeatureVector('Combined', Dependency(nlp_parser), Constituency(nlp_parser),
-                          PartOfSpeechTags(nlp_parser), Unigram(data.x_train), Ngram(3, data.x_train))
+                          PartOfSpeechTags(nlp_parser), unigram(), trigram())
         ]
 
     if features == FEATURES_LEXICAL:
         return [
-            FeatureVector('Lexical', Unigram(data.x_train), Ngram(3, data.x_train), SentenceLength())
+            FeatureVector('Lexical', unigram(), trigram(), SentenceLength())
         ]
 
     if features == FEATURES_SYNTACTIC:
@@ -167,25 +501,28 @@ def get_features(nlp_parser: NlpParser, data: ClassifierData, features: str):
         return [FeatureVector('Message Length', MessageLength())]
 
     if features == FEATURES_UNIGRAM:
-        return [FeatureVector('Unigram', Unigram(data.x_train))]
+        return [FeatureVector('Unigram', unigram())]
 
     if features == FEATURES_TRIGRAM:
-        return [FeatureVector('Trigram', Ngram(3, data.x_train))]
+        return [FeatureVector('Trigram', trigram())]
+
+    if features == FEATURES_HASHED:
+        return [FeatureVector('Hashed N-grams', HashedNgram((1, 3), HASHED_BUCKETS or 2 ** 18))]
 
     if features == FEATURES_SINGLES:
-        return get_features(nlp_parser, data, FEATURES_CONSTITUENCY) + \
-               get_features(nlp_parser, data, FEATURES_POS_TAG) + \
-               get_features(nlp_parser, data, FEATURES_DEPENDENCY) + \
-               get_features(nlp_parser, data, FEATURES_SENTENCE_LENGTH) + \
-               get_features(nlp_parser, data, FEATURES_MESSAGE_LENGTH) + \
-               get_features(nlp_parser, data, FEATURES_UNIGRAM) + \
-               get_features(nlp_parser, data, FEATURES_TRIGRAM)
+        return get_features(nlp_parser, data, FEATURES_CONSTITUENCY, dataset, vocabulary) + \
+               get_features(nlp_parser, data, FEATURES_POS_TAG, dataset, vocabulary) + \
+               get_features(nlp_parser, data, FEATURES_DEPENDENCY, dataset, vocabulary) + \
+               get_features(nlp_parser, data, FEATURES_SENTENCE_LENGTH, dataset, vocabulary) + \
+               get_features(nlp_parser, data, FEATURES_MESSAGE_LENGTH, dataset, vocabulary) + \
+               get_features(nlp_parser, data, FEATURES_UNIGRAM, dataset, vocabulary) + \
+               get_features(nlp_parser, data, FEATURES_TRIGRAM, dataset, vocabulary)
 
     if features == FEATURES_GROUPS:
-        return get_features(nlp_parser, data, FEATURES_ALL) + \
-               get_features(nlp_parser, data, FEATURES_COMBINED) + \
-               get_features(nlp_parser, data, FEATURES_LEXICAL) + \
-               get_features(nlp_parser, data, FEATURES_SYNTACTIC)
+        return get_features(nlp_parser, data, FEATURES_ALL, dataset, vocabulary) + \
+               get_features(nlp_parser, data, FEATURES_COMBINED, dataset, vocabulary) + \
+               get_features(nlp_parser, data, FEATURES_LEXICAL, dataset, vocabulary) + \
+               get_features(nlp_parser, data, FEATURES_SYNTACTIC, dataset, vocabulary)
 
 
 if __name__ == "__main__":
@@ -193,15 +530,119 @@ if __name__ == "__main__":
     parser.add_argument('-na', dest='no_auto_start', help='connect to a running nlp engine instead of starting a new server',
                         required=False, action='store_true', default=False)
     parser.add_argument('-nc', dest='no_cache', help='don\'t cache results from nlp engine', required=False, action='store_true', default=False)
+    parser.add_argument('-sr', dest='single_request', help='get all annotations of a message with a single nlp engine request',
+                        required=False, action='store_true', default=False)
+    parser.add_argument('-ns', dest='servers_num', help='number of nlp engine servers (ports 9001, 9002, ...)', type=int, required=False,
+                        default=1)
+    parser.add_argument('-p', dest='persistent', help='use persistent nlp engine servers that are started once and reused by later runs',
+                        required=False, action='store_true', default=False)
+    parser.add_argument('-it', dest='idle_timeout', help='minutes until idle persistent nlp engine servers are stopped', type=int,
+                        required=False, default=60)
+    parser.add_argument('-b', dest='parser', help='nlp parser backend (async: concurrent requests to running or persistent servers, replay: cached results only)',
+                        required=False, default=PARSER_STANFORD, choices=PARSER_CHOICES)
+    parser.add_argument('-rs', dest='strict', help='replay parser fails on messages that are not in the cache', required=False,
+                        action='store_true', default=False)
+    parser.add_argument('-mif', dest='max_in_flight', help='maximum number of concurrent requests of the async parser', type=int,
+                        required=False, default=256)
     parser.add_argument('-s', dest='silent', help='non verbose print (silent)', required=False, action='store_true', default=False)
     parser.add_argument('-d', dest='data_name', help='dataset name', required=False, default=DATA_MOVIES_120, choices=DATA_CHOICES)
+    parser.add_argument('-hg', dest='hashed_buckets', help='replace unigram and trigram features with hashed n-grams in this number of buckets',
+                        type=int, required=False, default=0)
+    parser.add_argument('-e', dest='executor', help='run features computation in threads, processes or both (hybrid: nlp engine requests in threads)',
+                        required=False, default=EXECUTOR_THREAD, choices=EXECUTOR_CHOICES)
+    parser.add_argument('-ew', dest='executor_workers', help='number of features computation workers (default: number of cores, at least 8 threads)', type=int,
+                        required=False, default=None)
+    parser.add_argument('-dw', dest='dataset_wide', help='compute syntactic and length features once for all the messages of the dataset',
+                        required=False, action='store_true', default=False)
+    parser.add_argument('-c', dest='classifier', help='classifier (sgd: logistic loss trained by stochastic gradient descent)',
+                        required=False, default=CLASSIFIER_LOGISTIC, choices=CLASSIFIER_CHOICES)
+    parser.add_argument('-lc', dest='logistic_c', help='inverse regularization strength (C) of logistic regression', type=float,
+                        required=False, default=1.0)
+    parser.add_argument('-lp', dest='logistic_penalty', help='penalty of logistic regression', required=False, default=PENALTY_L2,
+                        choices=PENALTY_CHOICES)
+    parser.add_argument('-ls', dest='logistic_solver', help='solver of logistic regression (saga: on max-abs scaled features, as in sweep)',
+                        required=False, default=SOLVER_LIBLINEAR, choices=SOLVER_CHOICES)
+    parser.add_argument('-bs', dest='batch_size', help='train the sgd classifier from feature batches of this number of messages',
+                        type=int, required=False, default=0)
+    parser.add_argument('-j', dest='jobs', help='number of experiments (users, iteration, feature set) that run in parallel processes',
+                        type=int, required=False, default=1)
+    parser.add_argument('-cv', dest='folds', help='k-fold cross validation of the selected users\' messages (implies -dw)', type=int,
+                        required=False, default=0)
+    parser.add_argument('-sd', dest='seed', help='random seed of the experiments (default: random, printed)', type=int, required=False,
+                        default=None)
     parser.add_argument('-i', dest='iterations', help='number of iterations (per feature)', type=int, required=False, default=1)
     parser.add_argument('-umin', dest='users_min', help='minimum number of users', type=int, required=False, default=10)
     parser.add_argument('-umax', dest='users_max', help='maximum number of users', type=int, required=False, default=10)
     parser.add_argument('-f', dest='features', help='feature set', required=False, default=FEATURES_COMBINED, choices=FEATURES_CHOICES)
 
+    commands = parser.add_subparsers(dest='command')
+    server_parser = commands.add_parser(COMMAND_SERVER, help='manage persistent nlp engine servers')
+    server_parser.add_argument('server_command', choices=SERVER_CHOICES)
+    precompute_parser = commands.add_parser(COMMAND_PRECOMPUTE, help='parse all messages of a dataset and store the results in the cache')
+    precompute_parser.add_argument('-w', dest='workers', help='number of parallel parsing threads', type=int, required=False, default=8)
+    train_parser = commands.add_parser(COMMAND_TRAIN, help='train a feature set (-f, -c) and save it as a model bundle')
+    train_parser.add_argument('-o', dest='model', help='model bundle file', required=True)
+    train_parser.add_argument('-un', dest='users', help='number of users', type=int, required=False, default=10)
+    predict_parser = commands.add_parser(COMMAND_PREDICT, help='top-k authors of messages (one per line) by a model bundle')
+    predict_parser.add_argument('-m', dest='model', help='model bundle file', required=True)
+    predict_parser.add_argument('-in', dest='input', help='messages file (default: stdin)', required=False, default='-')
+    predict_parser.add_argument('-k', dest='top_k', help='number of authors per message', type=int, required=False, default=3)
+    serve_parser = commands.add_parser(COMMAND_SERVE, help='serve a model bundle on a local http endpoint (POST /predict)')
+    serve_parser.add_argument('-m', dest='model', help='model bundle file', required=True)
+    serve_parser.add_argument('-port', dest='port', help='http port', type=int, required=False, default=8000)
+    serve_parser.add_argument('-k', dest='top_k', help='default number of authors per message', type=int, required=False, default=3)
+    serve_parser.add_argument('-rc', dest='cache_size', help='number of messages in the results cache', type=int, required=False,
+                              default=10000)
+    sweep_parser = commands.add_parser(COMMAND_SWEEP, help='f1-score and fit time of logistic regression (saga) for a grid of C values '
+                                                           'and penalties on the features of one split')
+    sweep_parser.add_argument('-un', dest='users', help='number of users', type=int, required=False, default=10)
+    sweep_parser.add_argument('-cs', dest='c_values', help='C values (inverse regularization strength)', type=float, nargs='+', required=False,
+                              default=[0.01, 0.1, 1.0, 10.0, 100.0])
+    sweep_parser.add_argument('-pe', dest='penalties', help='penalties', nargs='+', required=False, default=[PENALTY_L2, PENALTY_L1],
+                              choices=PENALTY_CHOICES)
+
     options = parser.parse_args()
 
     VERBOSE = not options.silent
-
-    main(options.no_auto_start, options.no_cache, options.data_name, options.features, options.users_min, options.users_max, options.iterations)
+    HASHED_BUCKETS = options.hashed_buckets
+    FEATURE_EXECUTOR = FeatureExecutor.create(options.executor, options.executor_workers)
+    CLASSIFIER = options.classifier
+    BATCH_SIZE = options.batch_size
+    LOGISTIC_C = options.logistic_c
+    LOGISTIC_PENALTY = options.logistic_penalty
+    LOGISTIC_SOLVER = options.logistic_solver
+
+    if options.classifier == CLASSIFIER_SGD and (options.logistic_c, options.logistic_penalty, options.logistic_solver) != (1.0, PENALTY_L2, SOLVER_LIBLINEAR):
+        parser.error('-lc, -lp and -ls configure the logistic regression classifier (-c logistic)')
+    if options.command == COMMAND_SERVER:
+        server(options.server_command, options.servers_num, options.idle_timeout)
+    elif options.command == COMMAND_PRECOMPUTE:
+        if options.no_cache:
+            parser.error('precompute stores results in the cache and can\'t run with -nc')
+        precompute(create_nlp_parser(options), options.data_name, options.workers)
+    elif options.command == COMMAND_TRAIN:
+        if options.features in [FEATURES_SINGLES, FEATURES_GROUPS]:
+            parser.error('a model bundle has one feature set, -f can\'t be singles or groups')
+        train(create_nlp_parser(options), options.data_name, options.features, options.users, options.model)
+    elif options.command == COMMAND_PREDICT:
+        if options.top_k < 1:
+            parser.error('-k must be at least 1')
+        predict(create_nlp_parser(options), options.model, options.input, options.top_k)
+    elif options.command == COMMAND_SERVE:
+        if options.top_k < 1:
+            parser.error('-k must be at least 1')
+        serve_model(create_nlp_parser(options), options.model, options.port, options.top_k, options.cache_size)
+    elif options.command == COMMAND_SWEEP:
+        sweep(create_nlp_parser(options), options.data_name, options.features, options.users, options.c_values, options.penalties,
+              options.jobs)
+    else:
+        if options.batch_size and options.classifier != CLASSIFIER_SGD:
+            parser.error('only the sgd classifier (-c sgd) is trained from batches (-bs)')
+        if options.jobs > 1 and options.executor != EXECUTOR_THREAD:
+            parser.error('parallel experiments (-j) compute features in threads, -e must be thread')
+        if options.jobs > 1 and options.parser == PARSER_ASYNC and not (options.dataset_wide or options.folds):
+            parser.error('the async parser runs in this process only, parallel experiments (-j) with it need -dw')
+        if options.folds == 1 or options.folds < 0:
+            parser.error('cross validation (-cv) needs at least 2 folds')
+        main(create_nlp_parser(options), options.data_name, options.features, options.users_min, options.users_max, options.iterations,
+             options.dataset_wide, options.jobs, options.folds, options.seed)
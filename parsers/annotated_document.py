@@ -0,0 +1,95 @@
+#  Copyright (C) 2019 Oleg Shnaydman, Victoria Smolensky
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+
+from parsers.dependency_arcs import DependencyArcs
+
+# Sentences with more tokens are not sent to the constituency parser - nlp engine may give timeout exception for long input.
+MAX_PARSE_TOKENS = 70
+
+
+# Conversions of CoreNLP json output to the format of the nlp parser results
+def json_pos_tags(sentences):
+    return [(token['word'], token['pos']) for sentence in sentences for token in sentence['tokens']]
+
+
+def json_dependencies(sentences):
+    return [(dependency['dep'], dependency['governor'], dependency['dependent'])
+            for sentence in sentences for dependency in sentence['basicDependencies']]
+
+
+def json_arcs(sentences):
+    # Dependencies of the sentences as a cacheable arcs dict
+    return DependencyArcs.from_triples(json_dependencies(sentences)).to_dict()
+
+
+class AnnotatedDocument:
+    pos_tags: list
+    trees: list
+    dependencies: DependencyArcs
+
+    def __init__(self, pos_tags, trees, dependencies):
+        self.pos_tags = pos_tags
+        self.trees = trees
+        self.dependencies = dependencies
+
+    def to_dict(self):
+        return {'pos_tags': self.pos_tags, 'trees': self.trees, 'dependencies': self.dependencies.to_dict()}
+
+    @staticmethod
+    def from_dict(document_dict):
+        return AnnotatedDocument(document_dict['pos_tags'], document_dict['trees'], DependencyArcs.of(document_dict['dependencies']))
+
+    @staticmethod
+    def from_corenlp_json(annotation):
+        sentences = annotation['sentences']
+        trees = [sentence['parse'] for sentence in sentences if len(sentence['tokens']) < MAX_PARSE_TOKENS]
+        return AnnotatedDocument(json_pos_tags(sentences), trees, DependencyArcs.from_triples(json_dependencies(sentences)))
+
+
+# Document that requests each annotation separately, the first time it is accessed.
+class LazyAnnotatedDocument(AnnotatedDocument):
+
+    def __init__(self, nlp_parser, document):
+        self.nlp_parser = nlp_parser
+        self.document = document
+        self._pos_tags = None
+        self._trees = None
+        self._dependencies = None
+
+    def __reduce__(self):
+        # Pickled without the parser, annotations that were not loaded stay empty
+        return AnnotatedDocument, (self._pos_tags, self._trees, self._dependencies)
+
+    @property
+    def pos_tags(self):
+        if self._pos_tags is None:
+            self._pos_tags = self.nlp_parser.pos_tag(self.document.message)
+        return self._pos_tags
+
+    @property
+    def trees(self):
+        if self._trees is None:
+            self._trees = self.nlp_parser.parse_many(self.document.parse_sentences)
+        return self._trees
+
+    @property
+    def dependencies(self):
+        if self._dependencies is None:
+            try:
+                self._dependencies = DependencyArcs.of(self.nlp_parser.dependency_parse(self.document.message))
+            except Exception:
+                self._dependencies = DependencyArcs.concatenate(map(DependencyArcs.of, self.nlp_parser.dependency_parse_many(self.document.sentences)))
+        return self._dependencies
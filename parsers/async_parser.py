@@ -0,0 +1,216 @@
+#  Copyright (C) 2019 Oleg Shnaydman, Victoria Smolensky
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+from parsers.annotated_document import AnnotatedDocument
+from parsers.cached_parser import CachedParser
+
+
+class AsyncCoreNlpServer:
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.in_flight = 0
+        self.failed_until = 0.0
+        # Open keep-alive connections that are not used by a request right now
+        self.idle_connections = list()
+
+
+# Asyncio HTTP/1.1 client of CoreNLP servers with keep-alive connections.
+# At most max_in_flight requests are sent at the same time, each one to the least loaded healthy server.
+class AsyncCoreNlpClient:
+    # Seconds that a failed server is skipped before it gets requests again
+    FAILURE_COOLDOWN = 30
+
+    def __init__(self, servers, max_in_flight, timeout):
+        self.servers = servers
+        self.timeout = timeout
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+
+    async def annotate(self, text, properties):
+        async with self._in_flight:
+            last_error = None
+            for _ in range(len(self.servers)):
+                server = self._select_server()
+                server.in_flight += 1
+                try:
+                    return await asyncio.wait_for(self._post(server, text, properties), self.timeout)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, OSError) as error:
+                    # Server is down or stuck - skip it for a while and retry on another one
+                    server.failed_until = time.time() + self.FAILURE_COOLDOWN
+                    last_error = error
+                finally:
+                    server.in_flight -= 1
+
+            raise last_error
+
+    def close(self):
+        for server in self.servers:
+            for _, writer in server.idle_connections:
+                writer.close()
+            server.idle_connections.clear()
+
+    def _select_server(self):
+        now = time.time()
+        healthy = [server for server in self.servers if server.failed_until <= now]
+        if healthy:
+            return min(healthy, key=lambda candidate: candidate.in_flight)
+        return min(self.servers, key=lambda candidate: candidate.failed_until)
+
+    async def _post(self, server, text, properties):
+        if server.idle_connections:
+            reader, writer = server.idle_connections.pop()
+            try:
+                return await self._request(server, reader, writer, text, properties)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                # The server may have closed the idle keep-alive connection - that is not a server failure,
+                # the request is sent once more on a fresh connection
+                pass
+
+        reader, writer = await asyncio.open_connection(server.host, server.port)
+        return await self._request(server, reader, writer, text, properties)
+
+    async def _request(self, server, reader, writer, text, properties):
+        try:
+            body = text.encode('utf-8')
+            request = f'POST /?properties={quote(json.dumps(properties))} HTTP/1.1\r\n' \
+                      f'Host: {server.host}:{server.port}\r\n' \
+                      f'Content-Type: text/plain; charset=utf-8\r\n' \
+                      f'Content-Length: {len(body)}\r\n' \
+                      f'Connection: keep-alive\r\n\r\n'
+            writer.write(request.encode('latin-1') + body)
+            await writer.drain()
+
+            status, headers, response = await self._read_response(reader)
+        except BaseException:
+            writer.close()
+            raise
+
+        if headers.get('connection', '').lower() == 'close':
+            writer.close()
+        else:
+            server.idle_connections.append((reader, writer))
+
+        if status != 200:
+            raise RuntimeError(f'nlp engine error {status}: {response[:200]}')
+        return response
+
+    @staticmethod
+    async def _read_response(reader):
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError('connection closed by nlp engine')
+        status = int(status_line.split()[1])
+
+        headers = dict()
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if 'content-length' in headers:
+            body = await reader.readexactly(int(headers['content-length']))
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = list()
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                chunk = await reader.readexactly(size + 2)
+                if size == 0:
+                    break
+                chunks.append(chunk[:-2])
+            body = b''.join(chunks)
+        else:
+            body = await reader.read()
+            headers['connection'] = 'close'
+
+        return status, headers, body.decode('utf-8')
+
+
+# Nlp parser that sends requests from an asyncio event loop running in a background thread.
+# Every message is annotated with a single request and prefetch keeps up to max_in_flight requests in flight.
+# The sync NlpParser methods and the async *_async methods can be used from any thread.
+class AsyncParser(CachedParser):
+    client: AsyncCoreNlpClient = None
+
+    def __init__(self, data_set_name, is_cached=False, servers_num=1, base_port=9001, host='localhost', max_in_flight=256,
+                 timeout=60, daemon=None):
+        super().__init__(data_set_name, is_cached, single_request=True)
+        # Persistent servers are started (or found) by the daemon, otherwise the servers must be running already
+        self.daemon = daemon
+        if self.daemon:
+            self.daemon.acquire()
+
+        # Cache (SQLite) reads and writes run in these threads, so they don't block the requests of the event loop
+        self._cache_executor = ThreadPoolExecutor(4)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+
+        servers = [AsyncCoreNlpServer(host, port) for port in range(base_port, base_port + servers_num)]
+        self.client = self._run(self._create_client(servers, max_in_flight, timeout))
+
+    @staticmethod
+    async def _create_client(servers, max_in_flight, timeout):
+        # Asyncio primitives must be created inside the event loop that uses them
+        return AsyncCoreNlpClient(servers, max_in_flight, timeout)
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self.client.close)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._cache_executor.shutdown()
+        if self.daemon:
+            self.daemon.release()
+        super().close()
+
+    def prefetch(self, documents):
+        messages = [document.message for document in documents]
+        missing = [message for message in dict.fromkeys(messages) if message not in self._prefetched]
+        annotations = dict(self._run(self._annotate_many(missing)))
+        annotations.update(self._prefetched)
+        self._prefetched = {message: annotations[message] for message in messages if annotations.get(message)}
+
+    async def annotate_async(self, message):
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._annotate_document(message), self._loop))
+
+    def _annotate(self, text, properties):
+        return json.loads(self._run(self.client.annotate(text, properties)))
+
+    async def _annotate_many(self, messages):
+        annotations = await asyncio.gather(*map(self._annotate_document, messages), return_exceptions=True)
+        # Failed messages are requested again (and fail in the feature) when they are used
+        return [(message, None if isinstance(annotation, Exception) else annotation) for message, annotation in zip(messages, annotations)]
+
+    async def _annotate_document(self, message):
+        document_dict = await self._loop.run_in_executor(self._cache_executor, self.document_cache.__getitem__, message) \
+            if self.is_cached else None
+        if not document_dict:
+            annotation = json.loads(await self.client.annotate(message, self.DOCUMENT_PROPERTIES))
+            document_dict = await self._loop.run_in_executor(self._cache_executor, self._store_document, message, annotation)
+        return AnnotatedDocument.from_dict(document_dict)
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
@@ -0,0 +1,172 @@
+#  Copyright (C) 2019 Oleg Shnaydman, Victoria Smolensky
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+
+import os
+from abc import abstractmethod
+
+from parsers.annotated_document import AnnotatedDocument, MAX_PARSE_TOKENS, json_pos_tags, json_arcs
+from parsers.dependency_arcs import DependencyArcs
+from parsers.nlp_parser import NlpParser
+from parsers.parse_store import ParseStore, CacheDict
+
+CACHE_DIR = 'cache'
+
+
+class CacheMissError(KeyError):
+    pass
+
+
+# Nlp parser that keeps all the results of the nlp engine in the persistent parse store.
+# Subclasses only send annotation requests to the engine.
+class CachedParser(NlpParser):
+    cache_store: ParseStore = None
+    pos_cache: CacheDict = None
+    dependency_cache: CacheDict = None
+    constituency_cache: CacheDict = None
+    document_cache: CacheDict = None
+
+    ANNOTATORS = 'tokenize,ssplit,pos,parse,depparse'
+    DOCUMENT_PROPERTIES = {'annotators': ANNOTATORS, 'outputFormat': 'json', 'parse.maxlen': str(MAX_PARSE_TOKENS)}
+    # Maximum number of sentences that are sent in one batch request
+    BATCH_SIZE = 16
+
+    def __init__(self, data_set_name, is_cached=False, single_request=False, read_only=False):
+        self.is_cached = is_cached
+        self.single_request = single_request
+        # Annotations of the last prefetched messages
+        self._prefetched = dict()
+
+        # Cache
+        if self.is_cached:
+            if not os.path.exists(CACHE_DIR) and not read_only:
+                os.makedirs(CACHE_DIR)
+            self.cache_store = ParseStore(os.path.join(CACHE_DIR, f'{data_set_name}_cache.sqlite'), read_only)
+            # Import caches left by older versions (one JSON file per annotation type), read only caches are never changed
+            if not read_only:
+                for kind in ['dependency', 'constituency']:
+                    self.cache_store.migrate_json(kind, os.path.join(CACHE_DIR, f'{data_set_name}_{kind}_cache.json'))
+            self.pos_cache = self.cache_store.view('pos')
+            self.dependency_cache = self.cache_store.view('dependency')
+            self.constituency_cache = self.cache_store.view('constituency')
+            self.document_cache = self.cache_store.view('document')
+
+    @abstractmethod
+    def _annotate(self, text, properties):
+        pass
+
+    def close(self):
+        if self.is_cached:
+            self.cache_store.close()
+
+    def pos_tag(self, sentence):
+        return self._execute_cached(self.pos_cache,
+                                    self.is_cached,
+                                    lambda text: json_pos_tags(self._request('pos', text)['sentences']),
+                                    sentence)
+
+    def parse(self, sentence):
+        return self._execute_cached(self.constituency_cache,
+                                    self.is_cached,
+                                    lambda text: self._request('pos,parse', text)['sentences'][0]['parse'],
+                                    sentence)
+
+    def dependency_parse(self, sentence):
+        # Dependencies are cached as columns of integers (arcs dict)
+        return DependencyArcs.of(self._execute_cached(self.dependency_cache,
+                                                      self.is_cached,
+                                                      lambda text: json_arcs(self._request('depparse', text)['sentences']),
+                                                      sentence))
+
+    def parse_many(self, sentences):
+        return self._execute_cached_many(self.constituency_cache,
+                                         'pos,parse',
+                                         lambda sentence: sentence['parse'],
+                                         self.parse,
+                                         sentences)
+
+    def dependency_parse_many(self, sentences):
+        return list(map(DependencyArcs.of, self._execute_cached_many(self.dependency_cache,
+                                                                     'depparse',
+                                                                     lambda sentence: json_arcs([sentence]),
+                                                                     self.dependency_parse,
+                                                                     sentences)))
+
+    def annotate(self, document):
+        annotation = self._prefetched.get(document.message)
+        if annotation:
+            if self.is_cached and document.message not in self.document_cache:
+                self.document_cache[document.message] = annotation.to_dict()
+            return annotation
+
+        # A stored annotation of the whole message answers separate requests too (e.g. replay of a single request run)
+        document_dict = self.document_cache[document.message] if self.is_cached else None
+        if document_dict:
+            return AnnotatedDocument.from_dict(document_dict)
+
+        if not self.single_request:
+            return super().annotate(document)
+        return AnnotatedDocument.from_dict(self._annotate_all(document.message))
+
+    def _annotate_all(self, message):
+        # Tokenize, split and tag once, then run both parsers on the same pipeline output
+        return self._store_document(message, self._annotate(message, self.DOCUMENT_PROPERTIES))
+
+    def _store_document(self, message, annotation):
+        document = AnnotatedDocument.from_corenlp_json(annotation)
+
+        # The whole annotation is stored, and shared with separate annotation requests of the same message
+        document_dict = document.to_dict()
+        if self.is_cached:
+            self.document_cache[message] = document_dict
+            self.pos_cache[message] = document.pos_tags
+            self.dependency_cache[message] = document.dependencies.to_dict()
+
+        return document_dict
+
+    def _request(self, annotators, text):
+        return self._annotate(text, {'annotators': annotators, 'outputFormat': 'json'})
+
+    def _execute_cached_many(self, cache, annotators, extract, method, sentences):
+        results = {sentence: cache[sentence] for sentence in sentences} if self.is_cached else dict()
+        missing = list(dict.fromkeys(sentence for sentence in sentences if not results.get(sentence)))
+
+        # Send the missing sentences in batches - one sentence per line
+        properties = {'annotators': annotators, 'outputFormat': 'json', 'ssplit.eolonly': 'true'}
+        for i in range(0, len(missing), self.BATCH_SIZE):
+            batch = missing[i:i + self.BATCH_SIZE]
+            annotation = self._annotate('\n'.join(batch), properties)
+            if len(annotation['sentences']) == len(batch):
+                for sentence, sentence_annotation in zip(batch, annotation['sentences']):
+                    results[sentence] = extract(sentence_annotation)
+                    if self.is_cached:
+                        cache[sentence] = results[sentence]
+            else:
+                # Sentences were not split back as expected (e.g. empty sentence) - fall back to separate requests
+                for sentence in batch:
+                    results[sentence] = method(sentence)
+
+        return [results[sentence] for sentence in sentences]
+
+    @staticmethod
+    def _execute_cached(cache, is_cached, method, sentence):
+        cached_value = cache[sentence] if is_cached else None
+        if cached_value:
+            return cached_value
+        else:
+            tree = method(sentence)
+            if is_cached:
+                cache[sentence] = tree
+            return tree
@@ -0,0 +1,182 @@
+#  Copyright (C) 2019 Oleg Shnaydman, Victoria Smolensky
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+
+import fcntl
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+import requests
+
+LOCK_FILE = os.path.join('cache', 'corenlp_server.lock')
+
+
+def is_process_alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except OSError:
+        return False
+
+
+def is_server_healthy(port):
+    try:
+        requests.get(f'http://localhost:{port}/live', timeout=2)
+        return True
+    except requests.exceptions.RequestException:
+        return False
+
+
+# Manages detached CoreNLP servers that outlive a single run.
+# The servers are described in a lock file (pids, ports, clients, last use) that later runs use to find and reuse them.
+# A detached watchdog stops the servers after they were not used for the idle timeout.
+class CoreNlpDaemon:
+    # Seconds to wait for a new server to answer
+    START_TIMEOUT = 120
+    # Seconds between two idle checks of the watchdog
+    WATCH_INTERVAL = 30
+
+    def __init__(self, corenlp_dir, servers_num=1, base_port=9001, memory='4g', idle_timeout=3600, lock_file=LOCK_FILE):
+        self.corenlp_dir = corenlp_dir
+        self.ports = list(range(base_port, base_port + servers_num))
+        self.memory = memory
+        self.idle_timeout = idle_timeout
+        self.lock_file = lock_file
+
+    def acquire(self):
+        started = list()
+        try:
+            with self._locked_state() as state:
+                clients = [pid for pid in state.get('clients', []) if is_process_alive(pid)]
+                if state and not clients and not self._is_running(state):
+                    # Nobody uses the servers and some of them are down or stuck - start over
+                    self._stop_servers(state)
+                    state.clear()
+
+                # Live servers are reused whatever their ports are (other runs may use them), missing ports are added
+                servers = [server for server in state.get('servers', []) if is_process_alive(server['pid'])]
+                ports = {server['port'] for server in servers}
+                for port in self.ports:
+                    if port not in ports:
+                        started.append({'port': port, 'pid': self._start_server(port), 'started': time.time()})
+                state['servers'] = sorted(servers + started, key=lambda server: server['port'])
+                state['idle_timeout'] = max(state.get('idle_timeout', 0), self.idle_timeout)
+                if not state.get('watchdog') or not is_process_alive(state['watchdog']):
+                    state['watchdog'] = self._start_watchdog()
+                state['clients'] = clients + [os.getpid()]
+                state['last_used'] = time.time()
+        except BaseException:
+            # Servers that were started by this call are not recorded in the lock file
+            self._stop_servers({'servers': started})
+            raise
+
+        self._wait_until_healthy()
+
+    def release(self):
+        with self._locked_state() as state:
+            if state:
+                state['clients'] = [pid for pid in state.get('clients', []) if pid != os.getpid() and is_process_alive(pid)]
+                state['last_used'] = time.time()
+
+    def status(self):
+        with self._locked_state() as state:
+            return dict(state, running=self._is_running(state)) if state else None
+
+    def stop(self):
+        with self._locked_state() as state:
+            self._stop_servers(state)
+            watchdog = state.get('watchdog')
+            if watchdog and watchdog != os.getpid() and is_process_alive(watchdog):
+                os.kill(watchdog, signal.SIGTERM)
+            state.clear()
+
+    def watch(self):
+        while True:
+            time.sleep(self.WATCH_INTERVAL)
+            with self._locked_state() as state:
+                if not state or state.get('watchdog') != os.getpid():
+                    return
+                clients = [pid for pid in state.get('clients', []) if is_process_alive(pid)]
+                if not clients and time.time() - state.get('last_used', 0) > state.get('idle_timeout', self.idle_timeout):
+                    self._stop_servers(state)
+                    state.clear()
+                    return
+
+    def _is_running(self, state):
+        # All the recorded servers (on any ports) are up
+        servers = state.get('servers', [])
+        return bool(servers) and all(self._is_server_running(server, state) for server in servers)
+
+    def _is_server_running(self, server, state):
+        if not is_process_alive(server['pid']):
+            return False
+        # Servers that are still loading are running too - another run started them a moment ago
+        is_starting = time.time() - server.get('started', state.get('started', 0)) < self.START_TIMEOUT
+        return is_starting or is_server_healthy(server['port'])
+
+    @property
+    def log_file(self):
+        return os.path.join(os.path.dirname(self.lock_file), 'corenlp_server.log')
+
+    def _start_server(self, port):
+        with open(self.log_file, 'a') as log_file:
+            process = subprocess.Popen(['java', f'-Xmx{self.memory}', '-cp', os.path.join(self.corenlp_dir, '*'),
+                                        'edu.stanford.nlp.pipeline.StanfordCoreNLPServer',
+                                        '-port', str(port), '-timeout', '30000'],
+                                       stdout=log_file, stderr=subprocess.STDOUT, start_new_session=True)
+        return process.pid
+
+    def _start_watchdog(self):
+        process = subprocess.Popen([sys.executable, '-m', 'parsers.corenlp_daemon', 'watch', self.lock_file],
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+        return process.pid
+
+    def _wait_until_healthy(self):
+        deadline = time.time() + self.START_TIMEOUT
+        while not all(map(is_server_healthy, self.ports)):
+            if time.time() > deadline:
+                raise TimeoutError(f'nlp engine servers {self.ports} did not start, see {self.log_file}')
+            time.sleep(1)
+
+    @staticmethod
+    def _stop_servers(state):
+        for server in state.get('servers', []):
+            if is_process_alive(server['pid']):
+                os.killpg(server['pid'], signal.SIGTERM)
+
+    @contextmanager
+    def _locked_state(self):
+        os.makedirs(os.path.dirname(self.lock_file), exist_ok=True)
+        with open(self.lock_file, 'a+') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            lock_file.seek(0)
+            content = lock_file.read()
+            state = json.loads(content) if content else dict()
+            yield state
+            lock_file.seek(0)
+            lock_file.truncate()
+            if state:
+                json.dump(state, lock_file)
+
+
+if __name__ == '__main__':
+    # Used to run the idle watchdog in a detached process: python -m parsers.corenlp_daemon watch <lock file>
+    if len(sys.argv) == 3 and sys.argv[1] == 'watch':
+        CoreNlpDaemon(None, lock_file=sys.argv[2]).watch()
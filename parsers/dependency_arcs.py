@@ -0,0 +1,81 @@
+#  Copyright (C) 2019 Oleg Shnaydman, Victoria Smolensky
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+
+import numpy as np
+
+ROOT = 'ROOT'
+
+
+class DependencyArcs:
+    # Dependency parse of a message as columns of integers - relation (id in the relation names of the parse),
+    # head and dependent of every arc. Sentences start at ROOT arcs, arcs before the first ROOT are in no sentence.
+    __slots__ = ('names', 'relations', 'heads', 'dependents', 'offsets')
+
+    def __init__(self, names, relations, heads, dependents):
+        self.names = tuple(names)
+        self.relations = np.asarray(relations, dtype=np.int16)
+        self.heads = np.asarray(heads, dtype=np.int32)
+        self.dependents = np.asarray(dependents, dtype=np.int32)
+
+        # Offsets of the sentences, the last offset is the end of the last sentence
+        root = self.names.index(ROOT) if ROOT in self.names else -1
+        self.offsets = np.append(np.flatnonzero(self.relations == root), len(self.relations))
+
+    def __len__(self):
+        return len(self.relations)
+
+    @property
+    def sentences_count(self):
+        return len(self.offsets) - 1
+
+    def to_triples(self):
+        return [(self.names[relation], head, dependent)
+                for relation, head, dependent in zip(self.relations.tolist(), self.heads.tolist(), self.dependents.tolist())]
+
+    def to_dict(self):
+        return {'names': list(self.names), 'relations': self.relations.tolist(), 'heads': self.heads.tolist(),
+                'dependents': self.dependents.tolist()}
+
+    @staticmethod
+    def from_dict(arcs_dict):
+        return DependencyArcs(arcs_dict['names'], arcs_dict['relations'], arcs_dict['heads'], arcs_dict['dependents'])
+
+    @staticmethod
+    def from_triples(triples):
+        names = list(dict.fromkeys(relation for relation, _, _ in triples))
+        ids = {name: i for i, name in enumerate(names)}
+        return DependencyArcs(names, [ids[relation] for relation, _, _ in triples], [head for _, head, _ in triples],
+                              [dependent for _, _, dependent in triples])
+
+    @staticmethod
+    def of(value):
+        # Arcs of a parse in any of the stored forms - arcs, arcs dict or (relation, head, dependent) list of older caches
+        if isinstance(value, DependencyArcs):
+            return value
+        if isinstance(value, dict):
+            return DependencyArcs.from_dict(value)
+        return DependencyArcs.from_triples(value)
+
+    @staticmethod
+    def concatenate(arcs_list):
+        arcs_list = list(arcs_list)
+        names = list(dict.fromkeys(name for arcs in arcs_list for name in arcs.names))
+        ids = {name: i for i, name in enumerate(names)}
+        relations = [np.array([ids[name] for name in arcs.names], dtype=np.int16)[arcs.relations] for arcs in arcs_list if len(arcs)]
+        return DependencyArcs(names,
+                              np.concatenate(relations) if relations else [],
+                              np.concatenate([arcs.heads for arcs in arcs_list]) if arcs_list else [],
+                              np.concatenate([arcs.dependents for arcs in arcs_list]) if arcs_list else [])
@@ -0,0 +1,123 @@
+#  Copyright (C) 2019 Oleg Shnaydman, Victoria Smolensky
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+
+import argparse
+import ast
+import json
+import re
+import threading
+import time
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+from urllib.parse import urlparse, parse_qs
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+SENTENCE_PATTERN = re.compile(r'(?<=[.!?])\s+')
+
+
+# Stand-in for the CoreNLP server that speaks its annotate protocol (POST text, json output) with a configurable latency.
+# Annotations are made up - it is meant for load tests of the client side, not for experiments.
+class FakeCoreNlpServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, port, latency=0.0):
+        super().__init__(('localhost', port), FakeCoreNlpHandler)
+        self.latency = latency
+        self.requests_count = 0
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    @staticmethod
+    def annotate(text, properties):
+        if properties.get('ssplit.eolonly') in ('true', True):
+            sentences = [line for line in text.split('\n') if line.strip()]
+        else:
+            sentences = [sentence for line in text.splitlines() for sentence in SENTENCE_PATTERN.split(line) if sentence.strip()]
+        return {'sentences': [FakeCoreNlpServer._annotate_sentence(index, sentence) for index, sentence in enumerate(sentences)]}
+
+    @staticmethod
+    def _annotate_sentence(index, sentence):
+        words = TOKEN_PATTERN.findall(sentence)
+        tags = [FakeCoreNlpServer._pos_tag(word) for word in words]
+        tokens = [{'index': i + 1, 'word': word, 'pos': tag} for i, (word, tag) in enumerate(zip(words, tags))]
+        parse = '(ROOT\n  (S ' + ' '.join(f'({tag} {word})' for word, tag in zip(words, tags)) + '))'
+        dependencies = [{'dep': 'ROOT', 'governor': 0, 'dependent': 1}] + \
+                       [{'dep': 'punct' if tag == '.' else 'dep', 'governor': 1, 'dependent': i + 1}
+                        for i, tag in enumerate(tags) if i > 0]
+        return {'index': index, 'tokens': tokens, 'parse': parse, 'basicDependencies': dependencies}
+
+    @staticmethod
+    def _pos_tag(word):
+        if word.isdigit():
+            return 'CD'
+        if not word[0].isalnum():
+            return '.'
+        return 'NNP' if word[0].isupper() else 'NN'
+
+
+class FakeCoreNlpHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        # Liveness and readiness checks
+        self._send(200, b'live', 'text/plain')
+
+    def do_POST(self):
+        text = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8')
+        properties = parse_qs(urlparse(self.path).query).get('properties', ['{}'])[0]
+        try:
+            properties = json.loads(properties)
+        except ValueError:
+            # Python dict representation, as sent by the stanfordcorenlp wrapper
+            properties = ast.literal_eval(properties)
+
+        time.sleep(self.server.latency)
+        self.server.requests_count += 1
+        self._send(200, json.dumps(FakeCoreNlpServer.annotate(text, properties)).encode('utf-8'), 'application/json')
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-port', dest='port', help='port of the first server', type=int, required=False, default=9001)
+    parser.add_argument('-ns', dest='servers_num', help='number of servers', type=int, required=False, default=1)
+    parser.add_argument('-latency', dest='latency', help='seconds to wait before each response', type=float, required=False, default=0.0)
+    options = parser.parse_args()
+
+    servers = [FakeCoreNlpServer(port, options.latency).start() for port in range(options.port, options.port + options.servers_num)]
+    print(f'fake nlp engine servers on ports {options.port}-{options.port + options.servers_num - 1}, press Ctrl+C to stop')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        for server in servers:
+            server.stop()
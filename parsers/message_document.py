@@ -0,0 +1,73 @@
+#  Copyright (C) 2019 Oleg Shnaydman, Victoria Smolensky
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+
+import operator
+from functools import reduce
+
+import nltk
+
+from parsers.annotated_document import MAX_PARSE_TOKENS
+
+
+# Preprocessed message that is shared by all the features of the message:
+# lines, sentences and token counts are computed once (on first use) and parser annotations are kept per parser.
+class MessageDocument:
+    __slots__ = ('message', 'row_id', '_lines', '_sentences', '_token_counts', '_annotations')
+
+    def __init__(self, message: str, row_id: int = None):
+        self.message = message
+        # Index of the message in its dataset, if it is known
+        self.row_id = row_id
+        self._lines = None
+        self._sentences = None
+        self._token_counts = None
+        self._annotations = dict()
+
+    @staticmethod
+    def of(data_element):
+        return data_element if isinstance(data_element, MessageDocument) else MessageDocument(data_element)
+
+    @property
+    def lines(self):
+        if self._lines is None:
+            self._lines = tuple(self.message.splitlines())
+        return self._lines
+
+    @property
+    def sentences(self):
+        if self._sentences is None:
+            # Convert message to a list of separated sentences -
+            # it will be quicker to analyze separate sentences with nlp engine.
+            self._sentences = tuple(reduce(operator.concat, map(nltk.sent_tokenize, self.lines)))
+        return self._sentences
+
+    @property
+    def token_counts(self):
+        if self._token_counts is None:
+            self._token_counts = tuple(len(nltk.word_tokenize(sentence)) for sentence in self.sentences)
+        return self._token_counts
+
+    @property
+    def parse_sentences(self):
+        # Filter out long sentences - nlp engine may give timeout exception for long input.
+        return [sentence for sentence, tokens in zip(self.sentences, self.token_counts) if tokens < MAX_PARSE_TOKENS]
+
+    def annotation(self, nlp_parser):
+        annotation = self._annotations.get(nlp_parser)
+        if annotation is None:
+            annotation = nlp_parser.annotate(self)
+            self._annotations[nlp_parser] = annotation
+        return annotation
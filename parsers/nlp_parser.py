@@ -15,6 +15,8 @@
 
 from abc import ABC, abstractmethod
 
+from parsers.annotated_document import LazyAnnotatedDocument
+
 
 class NlpParser(ABC):
 
@@ -29,3 +31,41 @@ class NlpParser(ABC):
     @abstractmethod
     def dependency_parse(self, sentence):
         pass
+
+    def parse_many(self, sentences):
+        return list(map(self.parse, sentences))
+
+    def dependency_parse_many(self, sentences):
+        return list(map(self.dependency_parse, sentences))
+
+    def prefetch(self, documents):
+        # Parsers that can annotate many messages concurrently get all the messages before features are built
+        pass
+
+    def annotate(self, document):
+        return LazyAnnotatedDocument(self, document)
+
+    def __reduce__(self):
+        # Parsers hold servers and cache connections that stay in their process,
+        # a pickled parser (e.g. in a feature sent to a worker process) is detached.
+        return DetachedParser, ()
+
+
+class DetachedParser(NlpParser):
+    # Stands for the parser in another process, documents are sent there with their annotations.
+    # All detached parsers are equal, so they find the annotations of the documents.
+
+    def pos_tag(self, sentence):
+        raise RuntimeError('detached nlp parser can\'t parse, annotations must be prepared before documents are pickled')
+
+    def parse(self, sentence):
+        return self.pos_tag(sentence)
+
+    def dependency_parse(self, sentence):
+        return self.pos_tag(sentence)
+
+    def __eq__(self, other):
+        return isinstance(other, DetachedParser)
+
+    def __hash__(self):
+        return hash(DetachedParser)
@@ -0,0 +1,127 @@
+#  Copyright (C) 2019 Oleg Shnaydman, Victoria Smolensky
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from urllib.request import pathname2url
+
+
+# Persistent key-value store for nlp engine results, backed by SQLite in WAL mode.
+# Every result is committed as soon as it is produced, values are stored as zlib compressed JSON.
+class ParseStore:
+
+    filename: str
+
+    def __init__(self, filename, read_only=False):
+        self.filename = filename
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        self._connection = None
+        self._pid = None
+
+    def _connect(self):
+        # SQLite connections must not be shared with forked processes - reopen after fork.
+        if self._connection is None or self._pid != os.getpid():
+            if self.read_only:
+                # Read only stores never create or change the file, a missing file is an empty store
+                if not os.path.isfile(self.filename):
+                    return None
+                self._connection = sqlite3.connect(f'file:{pathname2url(os.path.abspath(self.filename))}?mode=ro', uri=True,
+                                                   isolation_level=None, check_same_thread=False)
+            else:
+                self._connection = sqlite3.connect(self.filename, isolation_level=None, check_same_thread=False)
+                self._connection.execute('PRAGMA journal_mode=WAL')
+                self._connection.execute('PRAGMA synchronous=NORMAL')
+                self._connection.execute('CREATE TABLE IF NOT EXISTS cache ('
+                                         'kind TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, '
+                                         'PRIMARY KEY (kind, key))')
+            self._pid = os.getpid()
+        return self._connection
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None and self._pid == os.getpid():
+                self._connection.close()
+            self._connection = None
+
+    def get(self, kind, key):
+        with self._lock:
+            connection = self._connect()
+            row = connection and connection.execute('SELECT value FROM cache WHERE kind = ? AND key = ?', (kind, key)).fetchone()
+        return None if row is None else self._decode(row[0])
+
+    def put(self, kind, key, value):
+        if self.read_only:
+            return
+        with self._lock:
+            self._connect().execute('INSERT OR REPLACE INTO cache (kind, key, value) VALUES (?, ?, ?)',
+                                    (kind, key, self._encode(value)))
+
+    def contains(self, kind, key):
+        with self._lock:
+            connection = self._connect()
+            row = connection and connection.execute('SELECT 1 FROM cache WHERE kind = ? AND key = ?', (kind, key)).fetchone()
+        return row is not None
+
+    def migrate_json(self, kind, json_filename):
+        # One-shot import of a legacy JSON cache file. The file is renamed so it is never imported twice.
+        if not os.path.isfile(json_filename):
+            return 0
+
+        with open(json_filename) as cache_file:
+            legacy_cache = json.load(cache_file)
+
+        with self._lock:
+            connection = self._connect()
+            connection.execute('BEGIN')
+            connection.executemany('INSERT OR IGNORE INTO cache (kind, key, value) VALUES (?, ?, ?)',
+                                   ((kind, key, self._encode(value)) for key, value in legacy_cache.items() if value))
+            connection.execute('COMMIT')
+
+        os.rename(json_filename, json_filename + '.migrated')
+        return len(legacy_cache)
+
+    def view(self, kind):
+        return CacheDict(self, kind)
+
+    @staticmethod
+    def _encode(value):
+        return zlib.compress(json.dumps(value).encode('utf-8'))
+
+    @staticmethod
+    def _decode(blob):
+        return json.loads(zlib.decompress(blob).decode('utf-8'))
+
+
+class CacheDict:
+    store: ParseStore
+    kind: str
+
+    def __init__(self, store, kind):
+        self.store = store
+        self.kind = kind
+
+    def __getitem__(self, key):
+        return self.store.get(self.kind, key)
+
+    def __setitem__(self, key, value):
+        self.store.put(self.kind, key, value)
+
+    def __contains__(self, key):
+        return self.store.contains(self.kind, key)
@@ -0,0 +1,103 @@
+#  Copyright (C) 2019 Oleg Shnaydman, Victoria Smolensky
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+
+import json
+import threading
+import time
+
+import requests
+from stanfordcorenlp import StanfordCoreNLP
+
+
+class CoreNlpServer:
+    url: str
+    client: StanfordCoreNLP
+
+    def __init__(self, url, client=None):
+        self.url = url
+        # Client that owns the server process (None when attached to an external server)
+        self.client = client
+        self.in_flight = 0
+        self.failed_until = 0.0
+
+    def is_healthy(self, now):
+        return self.failed_until <= now
+
+
+# Pool of CoreNLP servers - every request goes to the least loaded healthy server
+# and is retried on another server when a server times out or refuses the connection.
+class CoreNlpServerPool:
+    # Seconds that a failed server is skipped before it gets requests again
+    FAILURE_COOLDOWN = 30
+    # Client side timeout (the server itself gives up after 30 seconds)
+    REQUEST_TIMEOUT = 60
+
+    def __init__(self, servers):
+        self.servers = list(servers)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def start(corenlp_dir, servers_num, base_port, memory, timeout):
+        return CoreNlpServerPool([CoreNlpServer(f'http://localhost:{port}',
+                                                StanfordCoreNLP(corenlp_dir, port=port, memory=memory, timeout=timeout))
+                                  for port in range(base_port, base_port + servers_num)])
+
+    @staticmethod
+    def attach(servers_num, base_port, host='http://localhost'):
+        return CoreNlpServerPool([CoreNlpServer(f'{host}:{port}') for port in range(base_port, base_port + servers_num)])
+
+    def close(self):
+        for server in self.servers:
+            if server.client:
+                server.client.close()
+
+    def annotate(self, text, properties):
+        return self._post(text, properties)
+
+    def _post(self, text, properties):
+        last_error = None
+        for _ in range(len(self.servers)):
+            server = self._acquire()
+            try:
+                response = requests.post(server.url,
+                                         params={'properties': json.dumps(properties)},
+                                         data=text.encode('utf-8'),
+                                         timeout=self.REQUEST_TIMEOUT)
+                response.raise_for_status()
+                return response.text
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as error:
+                # Server is down or stuck - skip it for a while and retry on another one
+                server.failed_until = time.time() + self.FAILURE_COOLDOWN
+                last_error = error
+            finally:
+                self._release(server)
+
+        raise last_error
+
+    def _acquire(self):
+        with self._lock:
+            now = time.time()
+            healthy = [server for server in self.servers if server.is_healthy(now)]
+            if healthy:
+                server = min(healthy, key=lambda candidate: candidate.in_flight)
+            else:
+                server = min(self.servers, key=lambda candidate: candidate.failed_until)
+            server.in_flight += 1
+            return server
+
+    def _release(self, server):
+        with self._lock:
+            server.in_flight -= 1
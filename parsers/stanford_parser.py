@@ -18,89 +18,53 @@ import os
 import zipfile
 
 import wget
-from stanfordcorenlp import StanfordCoreNLP
 
-from parsers.nlp_parser import NlpParser
+from parsers.cached_parser import CachedParser
+from parsers.corenlp_daemon import CoreNlpDaemon
+from parsers.server_pool import CoreNlpServerPool
 
-CACHE_DIR = 'cache'
+CORENLP_DIR = os.path.join('en', 'stanford-corenlp-full-2018-10-05')
 
 
-class CacheDict:
-    filename: str
-    cache: dict
+class StanfordParser(CachedParser):
+    stanford_parser: CoreNlpServerPool = None
+    daemon: CoreNlpDaemon = None
 
-    def __init__(self, filename):
-        self.filename = filename
-        try:
-            with open(self.filename) as cache_file:
-                self.cache = json.load(cache_file)
-        except Exception:
-            self.cache = dict()
-
-    def close(self):
-        with open(self.filename, 'w') as cache_file:
-            json.dump(self.cache, cache_file)
-
-    def __getitem__(self, key):
-        return self.cache.get(key)
-
-    def __setitem__(self, key, value):
-        self.cache[key] = value
-
-
-class StanfordParser(NlpParser):
-    stanford_parser: StanfordCoreNLP = None
-    dependency_cache: CacheDict = None
-    constituency_cache: CacheDict = None
-
-    def __init__(self, data_set_name, auto_start=True, is_cached=False):
+    def __init__(self, data_set_name, auto_start=True, is_cached=False, single_request=False, servers_num=1, base_port=9001,
+                 persistent=False, idle_timeout=3600):
         self._download_stanford_tools()
-        self.is_cached = is_cached
+        super().__init__(data_set_name, is_cached, single_request)
         self.auto_start = auto_start
-        if self.auto_start:
-            self.stanford_parser = StanfordCoreNLP(r'en/stanford-corenlp-full-2018-10-05', memory='8g', timeout=30000)
+        if persistent:
+            # Reuse detached servers of a previous run or start them for the next runs
+            self.daemon = self.create_daemon(servers_num, base_port, idle_timeout)
+            self.daemon.acquire()
+            self.stanford_parser = CoreNlpServerPool.attach(servers_num, base_port)
+        elif self.auto_start:
+            self.stanford_parser = CoreNlpServerPool.start(CORENLP_DIR, servers_num, base_port, self._server_memory(servers_num), 30000)
         else:
-            self.stanford_parser = StanfordCoreNLP(r'http://localhost:9001/', port=9001)
-
-        # Cache
-        if self.is_cached:
-            if not os.path.exists(CACHE_DIR):
-                os.makedirs(CACHE_DIR)
-            self.dependency_cache = CacheDict(os.path.join(CACHE_DIR, f'{data_set_name}_dependency_cache.json'))
-            self.constituency_cache = CacheDict(os.path.join(CACHE_DIR, f'{data_set_name}_constituency_cache.json'))
+            self.stanford_parser = CoreNlpServerPool.attach(servers_num, base_port)
 
-    def close(self):
-        if self.auto_start:
-            self.stanford_parser.close()
-
-        if self.is_cached:
-            self.dependency_cache.close()
-            self.constituency_cache.close()
-
-    def pos_tag(self, sentence):
-        return self.stanford_parser.pos_tag(sentence)
+    @staticmethod
+    def create_daemon(servers_num=1, base_port=9001, idle_timeout=3600, download=True):
+        # The distribution is needed only to start servers - status and stop work from the daemon lock file
+        if download:
+            StanfordParser._download_stanford_tools()
+        return CoreNlpDaemon(CORENLP_DIR, servers_num, base_port, StanfordParser._server_memory(servers_num), idle_timeout)
 
-    def parse(self, sentence):
-        return self._execute_cached(self.constituency_cache,
-                                    self.is_cached,
-                                    self.stanford_parser.parse,
-                                    sentence)
+    @staticmethod
+    def _server_memory(servers_num):
+        # Split the memory of a single server between the servers of the pool
+        return f'{max(3, 8 // servers_num)}g'
 
-    def dependency_parse(self, sentence):
-        return self._execute_cached(self.dependency_cache,
-                                    self.is_cached,
-                                    self.stanford_parser.dependency_parse,
-                                    sentence)
+    def close(self):
+        self.stanford_parser.close()
+        if self.daemon:
+            self.daemon.release()
+        super().close()
 
-    @staticmethod
-    def _execute_cached(cache, is_cached, method, sentence):
-        if is_cached and cache[sentence]:
-            return cache[sentence]
-        else:
-            tree = method(sentence)
-            if is_cached:
-                cache[sentence] = tree
-            return tree
+    def _annotate(self, text, properties):
+        return json.loads(self.stanford_parser.annotate(text, properties))
 
     @staticmethod
     def _download_stanford_tools():
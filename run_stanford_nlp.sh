@@ -1,2 +1,6 @@
-#!/bin/sh
-java -Xmx4g -cp "en/stanford-corenlp-full-2018-10-05/*" edu.stanford.nlp.pipeline.StanfordCoreNLPServer -port 9001 -timeout 30000
+#!/bin/bash
+SERVERS=${1:-1}
+for ((i = 0; i < SERVERS; i++)); do
+    java -Xmx4g -cp "en/stanford-corenlp-full-2018-10-05/*" edu.stanford.nlp.pipeline.StanfordCoreNLPServer -port $((9001 + i)) -timeout 30000 &
+done
+wait
@@ -0,0 +1,125 @@
+#  Copyright (C) 2019 Oleg Shnaydman, Victoria Smolensky
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import json
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+import numpy as np
+
+from features.feature_executor import FeatureExecutor
+from utils.model_bundle import ModelBundle
+
+
+class AuthorAttribution:
+    # Top-k authors of batches of messages by a loaded model bundle.
+    # Probabilities of recent messages are kept in an LRU cache, only new messages of a batch are featurized (in one batch)
+    # by the parser and executor that stay warm between batches.
+
+    def __init__(self, bundle: ModelBundle, executor: FeatureExecutor = None, cache_size=10000):
+        self.bundle = bundle
+        self.executor = executor
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def probabilities(self, messages: list) -> np.ndarray:
+        with self._lock:
+            cached = {message: self._cache[message] for message in messages if message in self._cache}
+            for message in cached:
+                self._cache.move_to_end(message)
+
+        missing = [message for message in dict.fromkeys(messages) if message not in cached]
+        if missing:
+            features = self.bundle.features_vector.convert_to_features(missing, False, self.executor)
+            for message, row in zip(missing, self.bundle.classifier.predict_proba(features)):
+                cached[message] = row
+            with self._lock:
+                for message in missing:
+                    self._cache[message] = cached[message]
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        return np.array([cached[message] for message in messages]).reshape(len(messages), len(self.bundle.classifier.classes))
+
+    def top_authors(self, messages: list, k=3) -> list:
+        # [(author, probability)] of the k most probable authors of every message
+        probabilities = self.probabilities(messages)
+        classes = self.bundle.classifier.classes
+        top = np.argsort(-probabilities, axis=1, kind='stable')[:, :k]
+        return [[(str(classes[column]), float(row[column])) for column in columns] for row, columns in zip(probabilities, top)]
+
+
+def attribution_json(attribution: list) -> list:
+    return [{'author': author, 'probability': probability} for author, probability in attribution]
+
+
+class _AttributionServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _AttributionHandler(BaseHTTPRequestHandler):
+    # POST /predict {"messages": [...], "k": 3} -> {"predictions": [[{"author": ..., "probability": ...}, ...], ...]}
+    # GET /health -> {"status": "ok", "model": ...}
+
+    def do_GET(self):
+        if self.path != '/health':
+            return self._send(404, {'error': 'not found'})
+        self._send(200, {'status': 'ok', 'model': self.server.attribution.bundle.features_vector.name})
+
+    def do_POST(self):
+        if self.path != '/predict':
+            return self._send(404, {'error': 'not found'})
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8'))
+            messages = request['messages']
+            k = int(request.get('k', self.server.top_k))
+            if k < 1:
+                raise ValueError('k must be at least 1')
+            if not isinstance(messages, list) or not all(isinstance(message, str) for message in messages):
+                raise ValueError('messages must be a list of strings')
+        except (ValueError, KeyError, TypeError) as error:
+            return self._send(400, {'error': str(error)})
+
+        predictions = self.server.attribution.top_authors(messages, k)
+        self._send(200, {'predictions': [attribution_json(attribution) for attribution in predictions]})
+
+    def _send(self, status, body):
+        content = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def serve(attribution: AuthorAttribution, port=8000, host='localhost', top_k=3, verbose=True):
+    server = _AttributionServer((host, port), _AttributionHandler)
+    server.attribution = attribution
+    server.top_k = top_k
+    server.verbose = verbose
+    print(f'serving {attribution.bundle.features_vector.name} on http://{host}:{port}/predict')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -16,14 +16,25 @@
 import csv
 import random
 
+from sklearn.model_selection import StratifiedKFold
+
 
 class ClassifierData:
 
-    def __init__(self, x_train, y_train, x_test, y_test):
+    def __init__(self, x_train, y_train, x_test, y_test, train_ids=None, test_ids=None):
         self.x_train = x_train
         self.y_train = y_train
         self.x_test = x_test
         self.y_test = y_test
+        # Row indices of the messages in the dataset (load_messages order)
+        self.train_ids = train_ids
+        self.test_ids = test_ids
+
+
+def load_messages(data_set_name) -> list:
+    # All (user_id, message) rows of the dataset, in file order
+    with open('data/{}.csv'.format(data_set_name)) as csv_file:
+        return [(row[0], row[1]) for row in csv.reader(csv_file, delimiter=',')]
 
 
 def load_classifier_data(data_set_name, users_num, test_ratio, posts_num=-1) -> ClassifierData:
@@ -35,16 +46,18 @@ def load_classifier_data(data_set_name, users_num, test_ratio, posts_num=-1) ->
         y_data_train = list()
         x_data_test = list()
         y_data_test = list()
+        train_ids = list()
+        test_ids = list()
 
         csv_reader = csv.reader(csv_file, delimiter=',')
 
-        # Load all data into dictionary (user_id, message)
-        for row in csv_reader:
+        # Load all data into dictionary (user_id, [(row_id, message)])
+        for row_id, row in enumerate(csv_reader):
             current_id = row[0]
             if file_dict.get(current_id):
-                file_dict.get(current_id).append(row[1])
+                file_dict.get(current_id).append((row_id, row[1]))
             else:
-                file_dict[current_id] = [row[1]]
+                file_dict[current_id] = [(row_id, row[1])]
 
         # Randomize messages
         for user_id, posts_list in file_dict.items():
@@ -63,12 +76,25 @@ def load_classifier_data(data_set_name, users_num, test_ratio, posts_num=-1) ->
 
         # Select train and test data
         for user_id, posts_list in user_ids[:users_num]:
-            x_data_train.extend(posts_list[:train_size])
+            train_ids.extend(row_id for row_id, _ in posts_list[:train_size])
+            x_data_train.extend(post for _, post in posts_list[:train_size])
             y_data_train.extend(train_size * [user_id])
-            x_data_test.extend(posts_list[-test_size:])
+            test_ids.extend(row_id for row_id, _ in posts_list[-test_size:])
+            x_data_test.extend(post for _, post in posts_list[-test_size:])
             y_data_test.extend(test_size * [user_id])
 
-        return ClassifierData(x_data_train, y_data_train, x_data_test, y_data_test)
+        return ClassifierData(x_data_train, y_data_train, x_data_test, y_data_test, train_ids, test_ids)
 
 
+def split_folds(data: ClassifierData, folds: int, seed: int) -> list:
+    # Stratified k-fold splits of all the selected messages (train and test), one ClassifierData per fold
+    x_data = data.x_train + data.x_test
+    y_data = data.y_train + data.y_test
+    row_ids = data.train_ids + data.test_ids
 
+    fold_data = list()
+    for train_index, test_index in StratifiedKFold(folds, shuffle=True, random_state=seed).split(x_data, y_data):
+        fold_data.append(ClassifierData([x_data[i] for i in train_index], [y_data[i] for i in train_index],
+                                        [x_data[i] for i in test_index], [y_data[i] for i in test_index],
+                                        [row_ids[i] for i in train_index], [row_ids[i] for i in test_index]))
+    return fold_data
@@ -0,0 +1,59 @@
+#  Copyright (C) 2019 Oleg Shnaydman, Victoria Smolensky
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+
+import random
+from collections import namedtuple
+
+from features.feature_executor import fork_context
+
+# One experiment - a feature set (index in the feature sets of the run) trained and tested on the users and messages
+# that a seeded random selection picks. All the feature sets of a (users, iteration) trial share its seed.
+# In cross validation the job trains and tests one fold of the trial messages (None - a single train / test split).
+Job = namedtuple('Job', ['users', 'iteration', 'feature_set', 'seed', 'fold'])
+
+# Job function of the current worker process, shipped once by the pool initializer
+_worker_run_job = None
+
+
+def expand_jobs(users_min: int, users_max: int, num_iterations: int, feature_sets: int, folds: int = 0, rng=random) -> list:
+    jobs = list()
+    for users in range(users_min, users_max + 1):
+        for iteration in range(num_iterations):
+            seed = rng.randrange(2 ** 32)
+            for fold in range(folds) if folds else [None]:
+                jobs.extend(Job(users, iteration, feature_set, seed, fold) for feature_set in range(feature_sets))
+    return jobs
+
+
+def _init_worker(run_job):
+    global _worker_run_job
+    _worker_run_job = run_job
+
+
+def _run_worker_job(job: Job):
+    return job, _worker_run_job(job)
+
+
+def run_jobs(run_job, jobs: list, workers: int = 1, chunk_size: int = 1):
+    # Yields (job, result) of every job as it completes - in order in this process with one worker,
+    # otherwise in any order from forked worker processes that share the read-only state of this process.
+    if workers <= 1:
+        for job in jobs:
+            yield job, run_job(job)
+        return
+
+    with fork_context().Pool(workers, initializer=_init_worker, initargs=(run_job,)) as pool:
+        yield from pool.imap_unordered(_run_worker_job, jobs, chunk_size)
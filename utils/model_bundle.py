@@ -0,0 +1,147 @@
+#  Copyright (C) 2019 Oleg Shnaydman, Victoria Smolensky
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import json
+import struct
+
+import numpy as np
+
+from classifiers.classifier import Classifier
+from classifiers.logistic_regression import LogisticRegressionClassifier
+from classifiers.sgd import SgdLogisticClassifier
+from features.constituency import Constituency
+from features.dependency import Dependency
+from features.features_vector import FeatureVector
+from features.grams import Unigram, Ngram, HashedNgram
+from features.length import SentenceLength, MessageLength
+from features.pos import PartOfSpeechTags
+from parsers.nlp_parser import NlpParser
+
+# Bundle file: magic, header length (uint64), JSON header and the arrays, every array at an aligned offset of the file.
+# The header has the feature vector config and layout, the classifier type and the dtype, shape and offset of every array.
+MAGIC = b'NLPMODEL'
+ALIGNMENT = 64
+FORMAT_VERSION = 1
+
+CLASSIFIER_TYPES = {'logistic': LogisticRegressionClassifier, 'sgd': SgdLogisticClassifier}
+PARSER_FEATURE_TYPES = {'constituency': Constituency, 'dependency': Dependency, 'pos_tags': PartOfSpeechTags}
+FEATURE_TYPES = {'sentence_length': SentenceLength, 'message_length': MessageLength}
+
+
+class ModelBundle:
+    # A trained model with everything that is needed to attribute new messages:
+    # the feature vector (features config, fitted vocabularies and column layout) and the fitted classifier.
+
+    def __init__(self, features_vector: FeatureVector, classifier: Classifier, metadata: dict = None):
+        self.features_vector = features_vector
+        self.classifier = classifier
+        self.metadata = metadata or dict()
+
+    def save(self, filename):
+        arrays = dict()
+        features = [_feature_config(feature, f'features.{i}', arrays) for i, feature in enumerate(self.features_vector.features)]
+        classifier_type = next(name for name, classifier_class in CLASSIFIER_TYPES.items() if type(self.classifier) is classifier_class)
+        for name, array in self.classifier.to_arrays().items():
+            arrays[f'classifier.{name}'] = np.ascontiguousarray(array)
+
+        # Offsets are relative to the end of the header, which is padded to the alignment
+        layout = dict()
+        offset = 0
+        for name, array in arrays.items():
+            layout[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+            offset += _aligned(array.nbytes)
+
+        header = json.dumps({'version': FORMAT_VERSION,
+                             'name': self.features_vector.name,
+                             'features': features,
+                             'offsets': self.features_vector.offsets.tolist(),
+                             'classifier': classifier_type,
+                             'metadata': self.metadata,
+                             'arrays': layout}).encode('utf-8')
+        header += b' ' * (_aligned(len(MAGIC) + 8 + len(header)) - len(MAGIC) - 8 - len(header))
+
+        with open(filename, 'wb') as bundle_file:
+            bundle_file.write(MAGIC)
+            bundle_file.write(struct.pack('<Q', len(header)))
+            bundle_file.write(header)
+            for array in arrays.values():
+                bundle_file.write(array.tobytes())
+                bundle_file.write(b'\0' * (_aligned(array.nbytes) - array.nbytes))
+
+    @staticmethod
+    def load(filename, nlp_parser: NlpParser):
+        # Arrays are memory mapped (read only), so loading doesn't read the model weights
+        buffer = np.memmap(filename, dtype=np.uint8, mode='r')
+        if bytes(buffer[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f'{filename} is not a model bundle')
+        header_length, = struct.unpack('<Q', bytes(buffer[len(MAGIC):len(MAGIC) + 8]))
+        data_offset = len(MAGIC) + 8 + header_length
+        header = json.loads(bytes(buffer[len(MAGIC) + 8:data_offset]).decode('utf-8'))
+        if header['version'] != FORMAT_VERSION:
+            raise ValueError(f'unsupported model bundle version {header["version"]}')
+
+        arrays = dict()
+        for name, layout in header['arrays'].items():
+            dtype = np.dtype(layout['dtype'])
+            start = data_offset + layout['offset']
+            size = int(np.prod(layout['shape'])) * dtype.itemsize
+            arrays[name] = buffer[start:start + size].view(dtype).reshape(layout['shape'])
+
+        features = [_load_feature(config, f'features.{i}', arrays, nlp_parser) for i, config in enumerate(header['features'])]
+        features_vector = FeatureVector(header['name'], *features)
+        if features_vector.offsets.tolist() != header['offsets']:
+            raise ValueError(f'features of {filename} don\'t match its column layout')
+
+        classifier_arrays = {name[len('classifier.'):]: array for name, array in arrays.items() if name.startswith('classifier.')}
+        classifier = CLASSIFIER_TYPES[header['classifier']].from_arrays(classifier_arrays)
+        return ModelBundle(features_vector, classifier, header['metadata'])
+
+
+def _aligned(size):
+    return (size + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _feature_config(feature, prefix, arrays: dict) -> dict:
+    # Config of a feature (its type and parameters), fitted vocabularies are added to the arrays
+    if isinstance(feature, Unigram):
+        arrays[prefix + '.vocabulary'] = _string_array(feature.unigrams)
+        return {'type': 'unigram'}
+    if isinstance(feature, Ngram):
+        arrays[prefix + '.vocabulary'] = _string_array(feature.ngrams)
+        return {'type': 'ngram', 'n': feature.n}
+    if isinstance(feature, HashedNgram):
+        return {'type': 'hashed_ngram', 'n_range': list(feature.n_range), 'buckets': feature.buckets, 'signed': feature.signed}
+    for name, feature_class in list(PARSER_FEATURE_TYPES.items()) + list(FEATURE_TYPES.items()):
+        if type(feature) is feature_class:
+            return {'type': name}
+    raise ValueError(f'feature {type(feature).__name__} can\'t be saved in a model bundle')
+
+
+def _load_feature(config: dict, prefix, arrays: dict, nlp_parser: NlpParser):
+    feature_type = config['type']
+    if feature_type == 'unigram':
+        return Unigram.from_vocabulary(arrays[prefix + '.vocabulary'].tolist())
+    if feature_type == 'ngram':
+        return Ngram.from_vocabulary(config['n'], arrays[prefix + '.vocabulary'].tolist())
+    if feature_type == 'hashed_ngram':
+        return HashedNgram(config['n_range'], config['buckets'], config['signed'])
+    if feature_type in PARSER_FEATURE_TYPES:
+        return PARSER_FEATURE_TYPES[feature_type](nlp_parser)
+    return FEATURE_TYPES[feature_type]()
+
+
+def _string_array(strings):
+    # N-grams have a fixed number of characters, so they fit a fixed width (UTF-32) array
+    return np.array(strings, dtype=f'<U{max(map(len, strings), default=1)}')
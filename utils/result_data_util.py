@@ -48,3 +48,13 @@ def print_result(res_dict: dict):
     # Rotate and print
     for row in zip(*rows):
         print(', '.join(row))
+
+
+def print_sweep(rows: list):
+    # rows: (feature group, PathPoint)
+    print('==============================')
+    print('CSV Data:')
+    print('==============================')
+    print(', '.join(['Features', 'Penalty', 'C', 'F1', 'Fit seconds', 'Iterations']))
+    for name, point in rows:
+        print(', '.join([name, point.penalty, str(point.c), str(point.f1_micro), f'{point.fit_seconds:.3f}', str(point.iterations)]))